@@ -0,0 +1,102 @@
+# archival.py
+import asyncio
+import logging
+
+import asyncpg
+
+from config import ARCHIVE_TABLESPACE
+from global_pool import get_connection, release_connection
+from database import TICKET_PARTITION_SPAN
+
+# Seconds between archival passes
+ARCHIVE_INTERVAL = 6 * 60 * 60
+
+async def _compact_partition(conn, name: str) -> None:
+    """
+    Rewrites an archived partition densely packed and frozen, or moves it
+    onto ARCHIVE_TABLESPACE when one is set. Nothing writes to it again
+    afterwards. Either way the partition and its indexes are rewritten
+    once: the move already copies them, so it is followed by a plain
+    freeze instead of VACUUM FULL.
+    """
+    await conn.execute(f"ALTER TABLE {name} SET (fillfactor = 100)")
+    if not ARCHIVE_TABLESPACE:
+        await conn.execute(f"VACUUM (FULL, FREEZE, ANALYZE) {name}")
+        return
+    await conn.execute(f'ALTER TABLE {name} SET TABLESPACE "{ARCHIVE_TABLESPACE}"')
+    indexes = await conn.fetch(
+        "SELECT indexrelid::regclass::text AS name FROM pg_index WHERE indrelid = $1::regclass",
+        name
+    )
+    for idx in indexes:
+        await conn.execute(f'ALTER INDEX {idx["name"]} SET TABLESPACE "{ARCHIVE_TABLESPACE}"')
+    await conn.execute(f"VACUUM (FREEZE, ANALYZE) {name}")
+
+async def archive_settled_partitions() -> list:
+    """
+    Moves every hot tickets partition whose pool_id range is fully
+    allocated and fully drawn into tickets_archive.
+    Per-user totals are unaffected: run_lottery already rolled those pools
+    into user_ticket_stats. Returns the lower bounds that were archived.
+    """
+    archived = []
+    conn = await get_connection()
+    try:
+        partitions = await conn.fetch(
+            """
+            SELECT c.relname
+              FROM pg_inherits i
+              JOIN pg_class c ON c.oid = i.inhrelid
+             WHERE i.inhparent = 'tickets'::regclass
+            """
+        )
+        max_pool_id = await conn.fetchval("SELECT COALESCE(MAX(pool_id), 0) FROM pools")
+        for p in partitions:
+            name = p["relname"]
+            if not name.startswith("tickets_p"):
+                continue
+            lo = int(name[len("tickets_p"):])
+            hi = lo + TICKET_PARTITION_SPAN
+            if max_pool_id < hi:
+                continue  # range can still receive new pools
+            unsettled = await conn.fetchval(
+                """
+                SELECT EXISTS (
+                    SELECT 1 FROM pools
+                     WHERE pool_id >= $1 AND pool_id < $2
+                       AND status IS DISTINCT FROM 'CLOSED'
+                )
+                """,
+                lo, hi
+            )
+            if unsettled:
+                continue
+            try:
+                async with conn.transaction():
+                    # DETACH needs an exclusive lock on `tickets`; never queue
+                    # behind a long purchase transaction, just retry next pass.
+                    await conn.execute("SET LOCAL lock_timeout = '2s'")
+                    await conn.execute(f"""
+                    ALTER TABLE tickets DETACH PARTITION {name};
+                    ALTER TABLE {name} RENAME TO tickets_archive_p{lo};
+                    ALTER TABLE tickets_archive ATTACH PARTITION tickets_archive_p{lo}
+                        FOR VALUES FROM ({lo}) TO ({hi});
+                    """)
+            except asyncpg.exceptions.LockNotAvailableError:
+                logging.info("archival of %s postponed: tickets is busy", name)
+                continue
+            await _compact_partition(conn, f"tickets_archive_p{lo}")
+            archived.append(lo)
+    finally:
+        await release_connection(conn)
+    return archived
+
+async def run_archival_job(interval: float = ARCHIVE_INTERVAL) -> None:
+    while True:
+        try:
+            archived = await archive_settled_partitions()
+            if archived:
+                print(f"[archival] Archived ticket partitions: {archived}")
+        except Exception as e:
+            logging.error("ticket archival failed: %s", e)
+        await asyncio.sleep(interval)
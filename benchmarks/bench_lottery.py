@@ -0,0 +1,53 @@
+"""
+Purchase and draw paths: buy_ticket, run_lottery and batch_pay_sol
+transaction building, against fake Postgres / Telegram / RPC.
+"""
+import base58
+import pytest
+from solders.keypair import Keypair
+
+import lottery
+from config import POOL_SIZE
+
+WALLET = {"wallet_public_key": "11111111111111111111111111111111", "wallet_private_key": "x"}
+
+@pytest.fixture
+def no_cooldown(monkeypatch):
+    monkeypatch.setattr(lottery, "BUY_COOLDOWN", 0)
+
+def bench_buy_ticket(benchmark, run, fake_db, stub_rpc, fake_bot, no_cooldown):
+    conn = fake_db({
+        "FROM pools WHERE status='OPEN'": {"pool_id": 1},
+        "SELECT COUNT(*) FROM tickets": 5,
+        "FROM users WHERE user_id": WALLET,
+        "COALESCE(SUM(value), 0)": 0.3,
+    })
+
+    result = benchmark(lambda: run(lottery.buy_ticket(7, 0.05, "low", None, fake_bot, num_tickets=3)))
+
+    assert result["success"], result
+    assert conn.queries
+
+def bench_run_lottery(benchmark, run, fake_db, stub_rpc, fake_bot):
+    tickets = [{"ticket_id": i, "user_id": 1000 + i, "value": 0.05} for i in range(POOL_SIZE)]
+    conn = fake_db({
+        "SELECT status, level FROM pools": {"status": "OPEN", "level": "low"},
+        "SELECT ticket_id, user_id, value FROM tickets": tickets,
+        "SELECT u.referred_by": [{"referred_by": 1, "value": 0.05}] * 5,
+        "SELECT wallet_public_key FROM users": WALLET["wallet_public_key"],
+        "SELECT first_name, username FROM users": {"first_name": "Player", "username": None},
+        "nextval(": 2,
+    })
+
+    benchmark(lambda: run(lottery.run_lottery(fake_bot, 1)))
+
+    assert conn.queries
+
+def bench_batch_pay_sol_message(benchmark, run, fake_rpc_client):
+    sender = Keypair()
+    private_b58 = base58.b58encode(bytes(sender)).decode()
+    transfers = [{"recipient": str(Keypair().pubkey()), "amount_sol": 0.01 * (i + 1)} for i in range(6)]
+
+    sig = benchmark(lambda: run(fake_rpc_client.batch_pay_sol(private_b58, str(sender.pubkey()), transfers)))
+
+    assert sig
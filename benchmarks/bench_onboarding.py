@@ -0,0 +1,86 @@
+"""
+Onboarding throughput: the bot's /start + disclaimer path (onboard_user,
+then accept_disclaimer) for many synthetic users at once, with wallets
+taken from the pre-generated reservoir vs. generated inline.
+
+Run against a scratch database (uses DATABASE_URL from .env):
+
+    python -m benchmarks.bench_onboarding --users 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import database
+import global_pool
+from database import accept_disclaimer, init_db, onboard_user
+from global_pool import init_db_pool, get_connection, release_connection
+from keypair_pool import refill_reservoir, reservoir_size
+
+# Synthetic users live far above real Telegram ids and are deleted afterwards
+_BASE_USER_ID = 9_100_000_000_000
+
+# Stands in for keypair_pool.RESERVE_KEYPAIR_CTE when the reservoir is off:
+# accept_disclaimer then finds no reserved wallet, like with an empty pool
+_NO_RESERVOIR_CTE = """
+        WITH reserved AS (
+            SELECT NULL::text AS public_key, NULL::text AS private_key WHERE FALSE
+        )
+"""
+
+async def _onboard(user_id: int) -> float:
+    t0 = time.perf_counter()
+    await onboard_user(user_id, f"bench{user_id}", "Bench")
+    wallet = await accept_disclaimer(user_id)
+    assert wallet["wallet_public_key"], f"user {user_id} got no wallet"
+    return time.perf_counter() - t0
+
+async def _run_phase(label: str, first_id: int, users: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(uid):
+        async with sem:
+            return await _onboard(uid)
+
+    t0 = time.perf_counter()
+    latencies = await asyncio.gather(*(one(first_id + i) for i in range(users)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{label:<10} {users / elapsed:8.1f} users/s   "
+        f"p50 {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms"
+    )
+
+async def _cleanup(first_id: int, last_id: int) -> None:
+    conn = await get_connection()
+    try:
+        await conn.execute("DELETE FROM users WHERE user_id >= $1 AND user_id < $2", first_id, last_id)
+    finally:
+        await release_connection(conn)
+
+async def main(users: int, concurrency: int) -> None:
+    await init_db_pool()
+    await init_db()
+    try:
+        await refill_reservoir(target=await reservoir_size() + users)
+        await _run_phase("reservoir", _BASE_USER_ID, users, concurrency)
+
+        # Same flow with the reservoir off: accept_disclaimer reserves
+        # nothing and falls back to generate_user_wallet, i.e. Keypair() inline
+        async def _no_reservoir(conn, user_id):
+            return None
+        database.RESERVE_KEYPAIR_CTE = _NO_RESERVOIR_CTE
+        database.assign_reserved_wallet = _no_reservoir
+        await _run_phase("inline", _BASE_USER_ID + users, users, concurrency)
+    finally:
+        await _cleanup(_BASE_USER_ID, _BASE_USER_ID + 2 * users)
+        await global_pool.pool.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.concurrency))
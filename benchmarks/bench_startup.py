@@ -0,0 +1,78 @@
+"""
+Cold-start cost: import time of the bot's modules (via -X importtime) and
+wall time from process start until main.py prints that it is polling.
+
+Run from the repository root; the time-to-poll part starts the real bot
+against DATABASE_URL / BOT_TOKEN from .env and stops it once it polls:
+
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --imports-only
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+POLLING_LINE = "[startup] Bot is polling now..."
+# Modules whose import should not be on the startup path
+HEAVY = ("PIL", "solana", "solders", "httpx", "pyarrow")
+
+def import_times(module: str) -> list:
+    """
+    [(cumulative_us, module)] for every module imported by `import module`,
+    from a fresh interpreter.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        # leading spaces in `name` mark nesting; keep them, minus the separator
+        rows.append((int(cumulative_us), name[1:].rstrip()))
+    return rows
+
+def report_imports(module: str, top: int) -> None:
+    rows = import_times(module)
+    total = max((us for us, name in rows if name == module), default=0)
+    print(f"import {module:<12} {total / 1000:8.1f} ms cumulative")
+    roots = {name.strip().split(".")[0] for _, name in rows}
+    heavy = sorted(roots & set(HEAVY))
+    print(f"  heavy modules loaded: {', '.join(heavy) or 'none'}")
+    top_level = sorted((r for r in rows if not r[1].startswith(" ")), reverse=True)[:top]
+    for us, name in top_level:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+def time_to_poll(timeout: float) -> float:
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "main.py"], stdout=subprocess.PIPE, text=True, env=env)
+    try:
+        for line in proc.stdout:
+            if POLLING_LINE in line:
+                return time.perf_counter() - t0
+            if time.perf_counter() - t0 > timeout:
+                break
+        raise RuntimeError("bot did not reach polling")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--imports-only", action="store_true")
+    args = parser.parse_args()
+
+    for module in ("main", "bot"):
+        report_imports(module, args.top)
+    if not args.imports_only:
+        samples = [time_to_poll(args.timeout) for _ in range(args.runs)]
+        print(f"time to polling      {statistics.median(samples) * 1000:8.1f} ms median of {args.runs}")
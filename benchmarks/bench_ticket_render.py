@@ -0,0 +1,39 @@
+"""
+Ticket image rendering throughput: one-off template preparation, then
+renders per second inline and through the render thread pool.
+
+Run from the repository root (the template path is relative):
+
+    python -m benchmarks.bench_ticket_render --renders 200
+"""
+import argparse
+import asyncio
+import time
+
+import ticket_image
+from ticket_image import init_ticket_renderer, render_ticket_image, _make_ticket_image
+
+def _names(n: int) -> list:
+    return [f"Player{i:04d}" for i in range(n)]
+
+async def main(renders: int) -> None:
+    t0 = time.perf_counter()
+    init_ticket_renderer()
+    print(f"template init        {(time.perf_counter() - t0) * 1000:8.1f} ms (once per process)")
+
+    t0 = time.perf_counter()
+    for name in _names(renders):
+        _make_ticket_image(name, 1.0)
+    elapsed = time.perf_counter() - t0
+    print(f"inline               {renders / elapsed:8.1f} renders/s")
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(render_ticket_image(name, 1.0) for name in _names(renders)))
+    elapsed = time.perf_counter() - t0
+    print(f"pool ({ticket_image.RENDER_WORKERS} threads)     {renders / elapsed:8.1f} renders/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.renders))
@@ -0,0 +1,53 @@
+"""
+Menu rendering paths: get_status_text, the keyboard builders and the
+ticket image.
+"""
+import os
+
+import keyboards
+from config import _LEVELS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def bench_get_status_text(benchmark, run, fake_db, stub_rpc, monkeypatch):
+    import database
+    import pool_state
+    from status_text import get_status_text
+
+    fake_db({})
+    user_id = 7
+    database._profile_cache.put(user_id, {
+        "username": "player", "first_name": "Player", "has_seen_disclaimer": True,
+        "wallet_public_key": "11111111111111111111111111111111", "balance": 10.0,
+    })
+    monkeypatch.setattr(pool_state, "_live", True)
+    monkeypatch.setattr(pool_state, "_snapshot", {
+        level: {"pool_id": i + 1, "count": 7, "pot": 0.35} for i, level in enumerate(_LEVELS)
+    })
+
+    text = benchmark(lambda: run(get_status_text(user_id)))
+
+    assert "Current Pools" in text
+
+def _build_all_keyboards():
+    for level in _LEVELS:
+        keyboards.play_menu_keyboard(level, 1, 13, 0.35)
+        keyboards.confirm_buy_keyboard_multi(level)
+        keyboards.confirm_buy_3_keyboard_multi(level)
+    keyboards.main_menu_keyboard()
+    keyboards.wallet_menu_keyboard()
+    keyboards.group_buy_signal_keyboard()
+    keyboards.play_again_keyboard()
+    keyboards.claim_keyboard(1)
+
+def bench_keyboard_builders(benchmark):
+    benchmark(_build_all_keyboards)
+
+def bench_make_ticket_image(benchmark, monkeypatch):
+    import ticket_image
+    monkeypatch.setattr(ticket_image, "TEMPLATE_PATH", os.path.join(REPO_ROOT, ticket_image.TEMPLATE_PATH))
+    ticket_image.init_ticket_renderer()
+
+    png = benchmark(ticket_image._make_ticket_image, "Player0042", 1.0)
+
+    assert png.startswith(b"\x89PNG")
@@ -0,0 +1,106 @@
+"""
+In-memory stand-ins used by the pytest-benchmark suite: an asyncpg-like
+connection, a Telegram session that never touches the network and an RPC
+client for solana_utils. Only the surface the bot actually uses is there.
+"""
+import json
+from collections import Counter
+from types import SimpleNamespace
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendPhoto
+
+class _FakeTransaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeConnection:
+    """
+    `responses` maps a SQL fragment to the result of queries containing it
+    (first match wins); a callable is called with the query arguments.
+    Unmatched queries return None / [] / "OK" like an empty database.
+    """
+    def __init__(self, responses: dict = None):
+        self.responses = list((responses or {}).items())
+        self.queries = 0
+
+    def _answer(self, query: str, args: tuple, default):
+        self.queries += 1
+        for fragment, value in self.responses:
+            if fragment in query:
+                return value(*args) if callable(value) else value
+        return default
+
+    async def fetchrow(self, query, *args):
+        return self._answer(query, args, None)
+
+    async def fetch(self, query, *args):
+        return self._answer(query, args, [])
+
+    async def fetchval(self, query, *args):
+        return self._answer(query, args, None)
+
+    async def execute(self, query, *args):
+        return self._answer(query, args, "OK")
+
+    def transaction(self):
+        return _FakeTransaction()
+
+    def is_in_transaction(self) -> bool:
+        return False
+
+class FakeSession(BaseSession):
+    """
+    aiogram session answering every API call locally: messages for send_*
+    and edit_*, True for everything else. `counts` tallies calls by method.
+    """
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.counts = Counter()
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls += 1
+        self.counts[type(method).__name__] += 1
+        chat_id = getattr(method, "chat_id", None) or 1
+        result = {
+            "message_id": self.calls,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if isinstance(method, SendPhoto):
+            result["photo"] = [{"file_id": "photo", "file_unique_id": "photo", "width": 1, "height": 1}]
+        if method.__returning__ is bool:
+            result = True
+        content = json.dumps({"ok": True, "result": result})
+        return self.check_response(bot=bot, method=method, status_code=200, content=content).result
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+class FakeRpcClient:
+    """
+    Replaces solana.rpc.async_api.AsyncClient: hands out a fixed blockhash
+    and "accepts" transactions, so signing and message building still run.
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def get_latest_blockhash(self, *args, **kwargs):
+        from solders.hash import Hash
+        return SimpleNamespace(value=SimpleNamespace(blockhash=Hash.default()))
+
+    async def send_transaction(self, tx, opts=None):
+        return SimpleNamespace(value=tx.signatures[0])
+
+    async def confirm_transaction(self, *args, **kwargs):
+        return None
+
+    async def close(self):
+        pass
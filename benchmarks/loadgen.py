@@ -0,0 +1,197 @@
+"""
+Synthetic traffic against the real router, without Telegram.
+
+Every simulated user runs a session (/start, disclaimer, wallet, play menu,
+stake switch, buy, stats, back to main) as a stream of Update objects fed
+to Dispatcher.feed_update; --input plays a recording from
+update_recorder.py instead, as fast as the concurrency allows (replay.py
+keeps its timing). Users run concurrently, each user's updates in
+order. Bot API calls go to a recording fake session and Solana RPC is
+stubbed, so only the bot and Postgres are exercised.
+
+Run against a scratch database (uses DATABASE_URL from .env; synthetic
+and recorded users are deleted afterwards, their tickets are not):
+
+    python -m benchmarks.loadgen --users 200 --concurrency 50
+    python -m benchmarks.loadgen --input updates.jsonl.gz --concurrency 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from collections import defaultdict
+from itertools import count
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+
+import global_pool
+import solana_utils
+from config import BOT_TOKEN
+from database import init_db, load_buy_signal_groups
+from global_pool import init_db_pool, get_connection, release_connection
+from update_recorder import ANON_ID_BASE, ANON_ID_SPAN, read_recording
+from update_scope import UpdateScopeMiddleware
+
+from benchmarks.fakes import FakeRpcClient, FakeSession
+
+# Synthetic users live far above real Telegram ids and are deleted afterwards
+_BASE_USER_ID = 9_200_000_000_000
+_BOT_USER = {"id": 42, "is_bot": True, "first_name": "LuckySol"}
+
+SESSION = [
+    ("message", "/start"),
+    ("callback", "accept_disclaimer"),
+    ("callback", "menu_wallet"),
+    ("callback", "menu_play"),
+    ("callback", "switch_stake:mid"),
+    ("callback", "init_buy_ticket:mid"),
+    ("callback", "confirm_buy:mid:yes"),
+    ("callback", "menu_stats"),
+    ("callback", "back_main"),
+]
+
+_update_ids = count(1)
+
+def make_update(user_id: int, kind: str, payload: str) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": f"Load{user_id % 10_000}"}
+    chat = {"id": user_id, "type": "private"}
+    update_id = next(_update_ids)
+    if kind == "message":
+        return {"update_id": update_id, "message": {
+            "message_id": update_id, "date": int(time.time()), "chat": chat, "from": user, "text": payload,
+        }}
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "from": user, "chat_instance": str(user_id), "data": payload,
+        "message": {"message_id": 1, "date": int(time.time()), "chat": chat, "from": _BOT_USER, "text": "menu"},
+    }}
+
+def synthetic_streams(users: int) -> dict:
+    return {
+        _BASE_USER_ID + u: [make_update(_BASE_USER_ID + u, kind, payload) for kind, payload in SESSION]
+        for u in range(users)
+    }
+
+def recorded_streams(path: str) -> dict:
+    """
+    user id -> [(t, update)] of that user, in file order.
+    """
+    from webhook import update_user_id
+    streams = defaultdict(list)
+    for record in read_recording(path):
+        streams[update_user_id(record["update"])].append((record["t"], record["update"]))
+    return streams
+
+class HandlerLatency(BaseMiddleware):
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    async def __call__(self, handler, event, data):
+        name = getattr(getattr(data.get("handler"), "callback", None), "__name__", "unknown")
+        t0 = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.samples[name].append(time.perf_counter() - t0)
+
+def _stub_rpc() -> None:
+    async def get_wallet_balance(pubkey_str: str) -> float:
+        return 10.0
+
+    async def transfer(*args, **kwargs) -> str:
+        return "1" * 88
+
+    solana_utils.AsyncClient = FakeRpcClient
+    solana_utils.get_wallet_balance = get_wallet_balance
+    solana_utils.pay_sol = transfer
+    solana_utils.batch_pay_sol = transfer
+
+def _p95(samples: list) -> float:
+    ordered = sorted(samples)
+    return ordered[max(0, int(len(ordered) * 0.95) - 1)]
+
+async def build_dispatcher() -> tuple:
+    """
+    (bot, dp, latency) wired like main.setup_bot, minus the background
+    jobs, with the fake Bot API session and stubbed RPC.
+    """
+    _stub_rpc()
+    await init_db_pool()
+    await init_db()
+    await load_buy_signal_groups()
+
+    from bot import router
+    bot = Bot(token=BOT_TOKEN, session=FakeSession())
+    latency = HandlerLatency()
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.update.outer_middleware(UpdateScopeMiddleware())
+    dp.message.middleware(latency)
+    dp.callback_query.middleware(latency)
+    dp.include_router(router)
+    return bot, dp, latency
+
+async def feed(bot: Bot, dp: Dispatcher, data: dict) -> None:
+    await dp.feed_update(bot, Update.model_validate(data, context={"bot": bot}))
+
+async def finish(bot: Bot, user_range: tuple) -> None:
+    """
+    Waits for background purchases, deletes the users in [lo, hi) and
+    closes the session and pool.
+    """
+    try:
+        # buys are acknowledged at once and finish in the background
+        purchases = [t for t in asyncio.all_tasks() if t.get_coro().__name__ == "_run_purchase"]
+        if purchases:
+            await asyncio.wait(purchases, timeout=30)
+        conn = await get_connection()
+        try:
+            await conn.execute("DELETE FROM users WHERE user_id >= $1 AND user_id < $2", *user_range)
+        finally:
+            await release_connection(conn)
+    finally:
+        await bot.session.close()
+        await global_pool.pool.close()
+
+def report(total: int, users: int, elapsed: float, bot: Bot, latency: HandlerLatency) -> None:
+    session = bot.session
+    print(f"{total} updates from {users} users in {elapsed:.2f}s ({total / elapsed:.1f} updates/s)")
+    print(f"{'handler':<28} {'calls':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, samples in sorted(latency.samples.items()):
+        print(f"{name:<28} {len(samples):>6} {statistics.median(samples) * 1000:>8.1f} {_p95(samples) * 1000:>8.1f}")
+    print(f"outbound Bot API calls: {session.calls}")
+    for method, n in session.counts.most_common():
+        print(f"  {method:<26} {n:>6}")
+
+async def main(users: int, concurrency: int, input_path: str) -> None:
+    bot, dp, latency = await build_dispatcher()
+    if input_path:
+        streams = {user: [u for _, u in s] for user, s in recorded_streams(input_path).items()}
+        user_range = (ANON_ID_BASE, ANON_ID_BASE + ANON_ID_SPAN)
+    else:
+        streams = synthetic_streams(users)
+        user_range = (_BASE_USER_ID, _BASE_USER_ID + users)
+    total = sum(len(s) for s in streams.values())
+    slots = asyncio.Semaphore(concurrency)
+
+    async def play(updates):
+        async with slots:
+            for data in updates:
+                await feed(bot, dp, data)
+
+    try:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(play(s) for s in streams.values()))
+        elapsed = time.perf_counter() - t0
+    finally:
+        await finish(bot, user_range)
+    print(f"concurrency {concurrency}")
+    report(total, len(streams), elapsed, bot, latency)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--input", default="", help="recording (see update_recorder.py) to run without its timing")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.concurrency, args.input))
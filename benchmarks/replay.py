@@ -0,0 +1,71 @@
+"""
+Replays a recording made with RECORD_UPDATES (update_recorder.py) into
+the real router with the original timing, or --speed times faster, so
+a production traffic shape (a draw, a referral spike) can be profiled
+offline. Each user's updates stay in order; Bot API calls go to the fake
+session and Solana RPC is stubbed, as in loadgen.py.
+
+Run against a scratch database (uses DATABASE_URL from .env; the
+pseudonymous users are deleted afterwards):
+
+    python -m benchmarks.replay updates.jsonl.gz --speed 10
+    python -m benchmarks.replay updates.jsonl.gz --speed 0 --start 120 --duration 60
+"""
+import argparse
+import asyncio
+import time
+
+from update_recorder import ANON_ID_BASE, ANON_ID_SPAN
+
+from benchmarks.loadgen import build_dispatcher, feed, finish, recorded_streams, report
+
+def select(streams: dict, start: float, duration: float) -> dict:
+    """
+    Only updates within [start, start + duration) seconds of the first one,
+    timestamps made relative to the start of that window.
+    """
+    first = min(t for s in streams.values() for t, _ in s)
+    end = start + duration if duration else float("inf")
+    selected = {}
+    for user, stream in streams.items():
+        window = [(t - first - start, u) for t, u in stream if start <= t - first < end]
+        if window:
+            selected[user] = window
+    return selected
+
+async def main(path: str, speed: float, start: float, duration: float) -> None:
+    streams = select(recorded_streams(path), start, duration)
+    total = sum(len(s) for s in streams.values())
+    bot, dp, latency = await build_dispatcher()
+    lag = []
+
+    async def play(stream):
+        for offset, data in stream:
+            if speed:
+                delay = offset / speed - (time.perf_counter() - t0)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    lag.append(-delay)
+            await feed(bot, dp, data)
+
+    try:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(play(s) for s in streams.values()))
+        elapsed = time.perf_counter() - t0
+    finally:
+        await finish(bot, (ANON_ID_BASE, ANON_ID_BASE + ANON_ID_SPAN))
+    print(f"speed {speed or 'max'}x")
+    report(total, len(streams), elapsed, bot, latency)
+    if lag:
+        # updates the bot could not take on time: it fell behind the recording
+        print(f"late updates: {len(lag)}, max {max(lag) * 1000:.0f} ms behind")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = original timing, 0 = no delays")
+    parser.add_argument("--start", type=float, default=0.0, help="seconds into the recording")
+    parser.add_argument("--duration", type=float, default=0.0, help="seconds to replay, 0 = all")
+    args = parser.parse_args()
+    asyncio.run(main(args.recording, args.speed, args.start, args.duration))
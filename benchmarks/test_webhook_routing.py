@@ -0,0 +1,53 @@
+"""
+Update routing of the webhook front: every user's updates land on one
+worker shard, in the order they were sent. Plain asserts, no timing.
+"""
+import json
+import queue
+
+from webhook import shard_for, update_user_id
+
+import webhook_smoke
+
+_USER = {"id": 1001, "is_bot": False, "first_name": "User"}
+_GROUP = {"id": -1002003004005, "type": "supergroup", "title": "Chat"}
+
+def test_update_user_id_of_every_update_kind():
+    assert update_user_id({"update_id": 1, "message": {
+        "message_id": 1, "date": 0, "chat": {"id": 1001, "type": "private"}, "from": _USER, "text": "/start",
+    }}) == 1001
+    assert update_user_id({"update_id": 2, "callback_query": {
+        "id": "2", "from": _USER, "chat_instance": "x", "data": "menu_play",
+        "message": {"message_id": 1, "date": 0, "chat": _GROUP, "text": "menu"},
+    }}) == 1001
+    assert update_user_id({"update_id": 3, "my_chat_member": {
+        "chat": _GROUP, "from": _USER, "date": 0,
+        "old_chat_member": {"status": "left", "user": {"id": 42, "is_bot": True, "first_name": "Bot"}},
+        "new_chat_member": {"status": "member", "user": {"id": 42, "is_bot": True, "first_name": "Bot"}},
+    }}) == 1001
+    # no sender: the chat decides
+    assert update_user_id({"update_id": 4, "channel_post": {
+        "message_id": 1, "date": 0, "chat": _GROUP, "text": "post",
+    }}) == _GROUP["id"]
+    assert update_user_id({"update_id": 5}) == 0
+
+def test_shard_for_is_stable_and_in_range():
+    for workers in (1, 2, 4, 7):
+        for user_id in (0, 1, 1001, 9_100_000_000_123, _GROUP["id"]):
+            shard = shard_for(user_id, workers)
+            assert 0 <= shard < workers
+            assert shard == shard_for(user_id, workers)
+
+def test_routing_keeps_each_user_on_one_shard_in_order():
+    users, updates, workers = 50, 5, 4
+    queues = [queue.Queue() for _ in range(workers)]
+    # interleaved like concurrent users: every user's seq 0, then every seq 1, ...
+    for seq in range(updates):
+        for u in range(users):
+            raw = json.dumps(webhook_smoke._update(seq * users + u, webhook_smoke._BASE_USER_ID + u, seq))
+            queues[shard_for(update_user_id(json.loads(raw)), workers)].put(raw)
+    webhook_smoke._check_shards(queues, users, updates)
+
+def test_front_keeps_each_user_on_one_shard_in_order(run):
+    # the in-process front over HTTP; _check_shards raises on a split or reorder
+    run(webhook_smoke.main("", users=20, updates=5, workers=4, concurrency=10))
@@ -0,0 +1,106 @@
+"""
+Posts synthetic updates to the webhook endpoint.
+
+Without --url the front is started in-process on a local port with plain
+queues in place of the worker processes (nothing reaches Telegram or the
+database); afterwards every user's updates must have landed on a single
+shard, in the order they were sent (test_webhook_routing.py runs this
+check under pytest):
+
+    python -m benchmarks.webhook_smoke --users 200 --updates 5
+
+With --url the updates go to a running instance (BOT_MODE=webhook).
+Handlers will fail to answer the made-up chats; that is expected.
+
+    python -m benchmarks.webhook_smoke --url http://localhost:8080/webhook
+"""
+import argparse
+import asyncio
+import json
+import queue
+import time
+
+import aiohttp
+from aiohttp import web
+
+from config import WEBHOOK_PATH, WEBHOOK_SECRET
+from webhook import SECRET_HEADER, make_app, update_user_id
+
+# Synthetic users live far above real Telegram ids
+_BASE_USER_ID = 9_100_000_000_000
+
+def _update(update_id: int, user_id: int, seq: int) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": f"Smoke{seq}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": seq + 1,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": user,
+            "text": "/start",
+        },
+    }
+
+async def _post_all(url: str, users: int, updates: int, concurrency: int) -> float:
+    headers = {SECRET_HEADER: WEBHOOK_SECRET} if WEBHOOK_SECRET else {}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def post_user(session, u):
+        # one user's updates are posted sequentially, like Telegram does
+        for seq in range(updates):
+            async with sem:
+                body = _update(u * updates + seq, _BASE_USER_ID + u, seq)
+                async with session.post(url, json=body, headers=headers) as resp:
+                    assert resp.status == 200, f"HTTP {resp.status}"
+
+    t0 = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(post_user(session, u) for u in range(users)))
+    return time.perf_counter() - t0
+
+def _check_shards(queues: list, users: int, updates: int) -> None:
+    seen = {}
+    for index, q in enumerate(queues):
+        while True:
+            try:
+                data = json.loads(q.get_nowait())
+            except queue.Empty:
+                break
+            user_id = update_user_id(data)
+            shard, last = seen.get(user_id, (index, -1))
+            assert shard == index, f"user {user_id} split across shards {shard} and {index}"
+            assert data["update_id"] > last, f"user {user_id} out of order"
+            seen[user_id] = (index, data["update_id"])
+    assert len(seen) == users, f"{len(seen)} of {users} users arrived"
+    print(f"ok: {users * updates} updates, each user on one shard, in order")
+
+async def main(url: str, users: int, updates: int, workers: int, concurrency: int) -> None:
+    runner = None
+    queues = []
+    if not url:
+        queues = [queue.Queue() for _ in range(workers)]
+        runner = web.AppRunner(make_app(queues, set_webhook=False))
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}{WEBHOOK_PATH}"
+    try:
+        elapsed = await _post_all(url, users, updates, concurrency)
+        print(f"posted {users * updates} updates in {elapsed:.2f}s ({users * updates / elapsed:.0f}/s)")
+    finally:
+        if runner:
+            await runner.cleanup()
+    if queues:
+        _check_shards(queues, users, updates)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.users, args.updates, args.workers, args.concurrency))
@@ -1,19 +1,17 @@
-﻿import logging
+﻿import asyncio
+import logging
 from aiogram import Bot, F, Router
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from aiogram.filters.state import StateFilter
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.state import State, StatesGroup
-from typing import Optional
-from solders.pubkey import Pubkey
+from typing import Dict, Optional
 
 # --------------------------
 # CONFIG IMPORTS
 # --------------------------
 from config import (
-    BOT_TOKEN,
     BOT_USERNAME,
     GROUP_CHAT_ID,
     POOL_SIZE,
@@ -29,23 +27,28 @@ from config import (
 # --------------------------
 from global_pool import get_connection, release_connection
 from database import (
-    create_or_update_user,
-    has_seen_disclaimer,
-    set_disclaimer_true,
+    onboard_user,
+    accept_disclaimer,
+    get_user_profile,
     get_buy_signals_enabled,
     set_buy_signals,
-    generate_user_wallet,
     sync_user_wallet_balance,
     get_user_stats,
+    get_user_level_stats,
     get_user_history,
-    get_referral_stats
+    get_referral_stats,
+    open_new_pool
 )
 
 # --------------------------
 # LOTTERY & CLAIM LOGIC
 # --------------------------
 from lottery import buy_ticket
+from signals import queue_buy_signal
+from pool_state import get_pool_snapshot
+from status_text import get_status_text
 from claim_logic import claim_ticket_logic
+from withdrawals import enqueue_withdrawal
 
 # --------------------------
 # KEYBOARDS & CONSTANTS
@@ -63,7 +66,6 @@ from keyboards import (
     confirm_buy_keyboard_multi,
     confirm_buy_3_keyboard_multi,
     claim_keyboard,
-    group_buy_signal_keyboard,
     referrals_keyboard,
     privatekey_keyboard,
     buy_now_keyboard,
@@ -73,10 +75,11 @@ from keyboards import (
 from emoji_constants import EMOJIS
 
 # --------------------------
-# LOGGER & BOT SETUP
+# LOGGER & ROUTER SETUP
 # --------------------------
+# The Bot itself is created once in main.py; handlers that need it take a
+# `bot: Bot` argument, which aiogram injects.
 logging.basicConfig(level=logging.INFO)
-bot = Bot(token=BOT_TOKEN, parse_mode="HTML")
 router = Router()
 
 # --------------------------
@@ -87,72 +90,6 @@ class WithdrawState(StatesGroup):
     waiting_for_amount  = State()
 
 
-from PIL import Image, ImageDraw, ImageFont
-import os
-import time
-
-def _make_ticket_image(username: str, amount: float) -> str:
-    """
-    Opens LuckyTicket_username.png, finds the blanco slot,
-    draws a white box with black outline around the username,
-    and saves out a new image.
-    """
-    base = Image.open("LuckyTicket_monogram.png").convert("RGBA")
-    w, h = base.size
-    draw = ImageDraw.Draw(base)
-
-    # 1) Detect the white-box region (bottom-right)
-    qr_x, qr_y = int(w * 0.6), int(h * 0.6)
-    pix = base.load()
-    whites = [(x,y) for y in range(qr_y,h) for x in range(qr_x,w)
-              if pix[x,y][:3] == (255,255,255)]
-    if whites:
-        xs, ys = zip(*whites)
-        minx, maxx = min(xs), max(xs)
-        miny, maxy = min(ys), max(ys)
-    else:
-        minx, maxx = int(w*0.7), w-10
-        miny, maxy = int(h*0.8), h-10
-
-    # 2) Prepare text
-    text = username
-    font_size = max(24, int(h * 0.05))
-    font = ImageFont.truetype("arialbd.ttf", size=font_size)
-    bbox = draw.textbbox((0,0), text, font=font)
-    tw, th = bbox[2]-bbox[0], bbox[3]-bbox[1]
-
-    # 3) Compute box dimensions
-    pad_x = 10
-    pad_y = 5
-    box_w = max(tw + 2*pad_x, 120)           # enforce minimum 120px
-    box_h = th + 2*pad_y
-    region_w = maxx - minx + 1
-
-    # 4) Center the box inside the white slot
-    box_x1 = minx + (region_w - box_w)//2
-    box_y2 = maxy
-    box_x2 = box_x1 + box_w
-    box_y1 = box_y2 - box_h
-
-    # 5) Draw the white-filled box with 1px black outline
-    draw.rectangle(
-        [(box_x1, box_y1), (box_x2, box_y2)],
-        fill=(255,255,255,255),
-        outline=(0,0,0,255),
-        width=1
-    )
-
-    # 6) Draw the text centered in that box
-    text_x = box_x1 + (box_w - tw)//2
-    text_y = box_y1 + pad_y - 3
-    draw.text((text_x, text_y), text, font=font, fill=(0,0,0,255))
-
-    # 7) Save and return
-    fname = f"ticket_{username}_{int(time.time())}.png"
-    base.save(fname)
-    return fname
-
-
 # --------------------------
 # REFERRAL PARSER
 # --------------------------
@@ -174,23 +111,13 @@ async def cb_menu_referrals(cbq: CallbackQuery):
     user_id = cbq.from_user.id
     link = f"https://t.me/{BOT_USERNAME}?start=ref{user_id}"
 
-    conn = await get_connection()
-    try:
-        referral_count = await conn.fetchval(
-            "SELECT COUNT(*) FROM users WHERE referred_by = $1", user_id
-        )
-        earnings = await conn.fetchval(
-            "SELECT COALESCE(referral_earnings, 0) FROM users WHERE user_id = $1",
-            user_id
-        )
-    finally:
-        await release_connection(conn)
+    stats = await get_referral_stats(user_id)
 
     text = (
         f"🤝 <b>Your Referral Program</b>\n\n"
         f"🔗 Share this link:\n<code>{link}</code>\n\n"
-        f"👥 Referrals: <b>{referral_count}</b>\n"
-        f"💰 Earned: <b>{earnings:.4f} SOL</b>"
+        f"👥 Referrals: <b>{stats['referred_count']}</b>\n"
+        f"💰 Earned: <b>{stats['referral_earnings']:.4f} SOL</b>"
     )
     await cbq.message.edit_text(text, parse_mode="HTML", reply_markup=referrals_keyboard())
 
@@ -207,15 +134,15 @@ async def cmd_start(msg: Message):
     first_name = msg.from_user.first_name or ""
     ref_id = _extract_referrer_id(msg.text, user_id)
 
-    await create_or_update_user(user_id, username, first_name, referred_by=ref_id)
+    onboarding = await onboard_user(user_id, username, first_name, referred_by=ref_id)
 
-    if not await has_seen_disclaimer(user_id):
+    if not onboarding["profile"]["has_seen_disclaimer"]:
         await msg.answer(
             f"🏆 <b>Welcome to Solana Lottery Bot!</b>\n\n{DISCLAIMER_TEXT}",
             reply_markup=disclaimer_keyboard(),
         )
     else:
-        status = await get_status_text(user_id)
+        status = await get_status_text(user_id, pools=onboarding["pools"])
         await msg.answer(
             f"{status}\n\n🎉 <b>Welcome back!</b> Please choose an option below:",
             reply_markup=main_menu_keyboard(),
@@ -227,8 +154,7 @@ async def cmd_start(msg: Message):
 @router.callback_query(F.data == "accept_disclaimer")
 async def cb_accept_disclaimer(cbq: CallbackQuery):
     user_id = cbq.from_user.id
-    await set_disclaimer_true(user_id)
-    wallet_info = await generate_user_wallet(user_id)
+    wallet_info = await accept_disclaimer(user_id)
 
     if wallet_info.get("wallet_private_key"):
         text = (
@@ -318,43 +244,32 @@ async def cb_menu_wallet(cbq: CallbackQuery):
     )
 
 # --------------------------
-# PLAY MENU (MULTI-STAKE)
+# POOL INFO (LIVE SNAPSHOT)
 # --------------------------
-@router.callback_query(F.data == "menu_play")
-async def cb_menu_play(cbq: CallbackQuery, state: FSMContext):
+async def _level_pool(level: str) -> tuple:
+    """
+    (pool_id, spots_left, pot) of the level's open pool, read from the
+    pool_state snapshot; pool_id is None when the level has no open pool.
+    """
+    snap = await get_pool_snapshot(level)
+    if not snap:
+        return None, 0, 0.0
+    return snap["pool_id"], POOL_SIZE - snap["count"], snap["pot"]
+
+async def _show_play_menu(cbq: CallbackQuery, state: FSMContext, level: str):
     user_id = cbq.from_user.id
-    data    = await state.get_data()
-    level   = data.get("last_level", _LEVELS[0])
 
-    # 1) Fetch on-chain balance
+    # 1) Fetch on-chain balance and pool info for this level
     balance = await sync_user_wallet_balance(user_id)
+    pool_id, spots_left, pot = await _level_pool(level)
 
-    # 2) Fetch pool info for this level
-    conn = await get_connection()
-    try:
-        row = await conn.fetchrow(
-            "SELECT pool_id FROM pools WHERE status='OPEN' AND level=$1 ORDER BY pool_id LIMIT 1",
-            level
-        )
-        if row:
-            pool_id    = row["pool_id"]
-            count      = await conn.fetchval("SELECT COUNT(*) FROM tickets WHERE pool_id=$1", pool_id)
-            spots_left = POOL_SIZE - count
-            pot        = float(await conn.fetchval(
-                "SELECT COALESCE(SUM(value),0) FROM tickets WHERE pool_id=$1", pool_id
-            ))
-        else:
-            pool_id, spots_left, pot = None, 0, 0.0
-    finally:
-        await release_connection(conn)
-
-    # 3) Remember this level for next time
+    # 2) Remember this level for next time
     await state.update_data(last_level=level)
 
     emoji = _LEVEL_EMOJIS[level]
     name  = _LEVEL_NAMES[level]
 
-    # 4) Build header and reply
+    # 3) Build header and reply
     header = (
         f"🎰 <b>Lottery Menu</b>\n"
         f"💰 <b>Balance:</b> {balance:.4f} SOL\n\n"
@@ -367,237 +282,148 @@ async def cb_menu_play(cbq: CallbackQuery, state: FSMContext):
         reply_markup=play_menu_keyboard(level, pool_id, spots_left, pot)
     )
 
-# --------------------------
-# SWITCH STAKE
-# --------------------------
-@router.callback_query(F.data.startswith("switch_stake:"))
-async def cb_switch_stake(cbq: CallbackQuery, state: FSMContext):
-    user_id = cbq.from_user.id
-    level   = cbq.data.split(":", 1)[1]
-
-    # new on-chain balance
-    balance = await sync_user_wallet_balance(user_id)
+async def _show_buy_prompt(cbq: CallbackQuery, num_tickets: int, reply_markup):
+    level = cbq.data.split(":", 1)[1]
+    emoji, name = _LEVEL_EMOJIS[level], _LEVEL_NAMES[level]
+    balance = await sync_user_wallet_balance(cbq.from_user.id)
 
-    # fetch new level pool info
-    conn = await get_connection()
-    try:
-        row = await conn.fetchrow(
-            "SELECT pool_id FROM pools WHERE status='OPEN' AND level=$1 ORDER BY pool_id LIMIT 1",
-            level
+    pool_id, spots_left, pot = await _level_pool(level)
+    if pool_id is None:
+        return await cbq.message.edit_text(
+            "⛔ <b>No open pool at that level.</b>",
+            reply_markup=main_menu_keyboard()
         )
-        if row:
-            pool_id    = row["pool_id"]
-            count      = await conn.fetchval("SELECT COUNT(*) FROM tickets WHERE pool_id=$1", pool_id)
-            spots_left = POOL_SIZE - count
-            pot        = float(await conn.fetchval(
-                "SELECT COALESCE(SUM(value),0) FROM tickets WHERE pool_id=$1", pool_id
-            ))
-        else:
-            pool_id, spots_left, pot = None, 0, 0.0
-    finally:
-        await release_connection(conn)
-
-    await state.update_data(last_level=level)
-    emoji = _LEVEL_EMOJIS[level]
-    name  = _LEVEL_NAMES[level]
 
-    header = (
+    label = "Buy 1× Ticket" if num_tickets == 1 else f"Buy {num_tickets}× Tickets"
+    text = (
         f"🎰 <b>Lottery Menu</b>\n"
         f"💰 <b>Balance:</b> {balance:.4f} SOL\n\n"
-        f"🔖 <b>Chosen Tier:</b> {emoji} {name}\n"
+        f"🔖 <b>Tier:</b> {emoji} {name}\n"
+        f"🎟 <b>{label}</b>\n"
         f"┣ 🎟 Spots left: <b>{spots_left}/{POOL_SIZE}</b>\n"
         f"┗ 💰 Pot: <b>{pot:.2f} SOL</b>"
     )
-    await cbq.message.edit_text(header, reply_markup=play_menu_keyboard(level, pool_id, spots_left, pot))
+    await cbq.message.edit_text(text, reply_markup=reply_markup(level))
+
+# --------------------------
+# PLAY MENU (MULTI-STAKE)
+# --------------------------
+@router.callback_query(F.data == "menu_play")
+async def cb_menu_play(cbq: CallbackQuery, state: FSMContext):
+    data  = await state.get_data()
+    level = data.get("last_level", _LEVELS[0])
+    await _show_play_menu(cbq, state, level)
+
+# --------------------------
+# SWITCH STAKE
+# --------------------------
+@router.callback_query(F.data.startswith("switch_stake:"))
+async def cb_switch_stake(cbq: CallbackQuery, state: FSMContext):
+    level = cbq.data.split(":", 1)[1]
+    await _show_play_menu(cbq, state, level)
 
 # --------------------------
 # INIT BUY: SINGLE TICKET
 # --------------------------
 @router.callback_query(F.data.startswith("init_buy_ticket:"))
 async def cb_init_buy_ticket(cbq: CallbackQuery):
-    level = cbq.data.split(":", 1)[1]
-    emoji, name = _LEVEL_EMOJIS[level], _LEVEL_NAMES[level]
-    user_id = cbq.from_user.id
-    balance = await sync_user_wallet_balance(user_id)
-
-    conn = await get_connection()
-    try:
-        row = await conn.fetchrow(
-            "SELECT pool_id FROM pools WHERE status='OPEN' AND level=$1 ORDER BY pool_id LIMIT 1",
-            level
-        )
-        if not row:
-            return await cbq.message.edit_text(
-                "⛔ <b>No open pool at that level.</b>",
-                reply_markup=main_menu_keyboard()
-            )
-        pool_id    = row["pool_id"]
-        filled     = await conn.fetchval("SELECT COUNT(*) FROM tickets WHERE pool_id=$1", pool_id)
-        spots_left = POOL_SIZE - filled
-        pot        = float(await conn.fetchval(
-            "SELECT COALESCE(SUM(value),0) FROM tickets WHERE pool_id=$1", pool_id
-        ))
-    finally:
-        await release_connection(conn)
-
-    text = (
-        f"🎰 <b>Lottery Menu</b>\n"
-        f"💰 <b>Balance:</b> {balance:.4f} SOL\n\n"
-        f"🔖 <b>Tier:</b> {emoji} {name}\n"
-        f"🎟 <b>Buy 1× Ticket</b>\n"
-        f"┣ 🎟 Spots left: <b>{spots_left}/{POOL_SIZE}</b>\n"
-        f"┗ 💰 Pot: <b>{pot:.2f} SOL</b>"
-    )
-    await cbq.message.edit_text(text, reply_markup=confirm_buy_keyboard_multi(level))
+    await _show_buy_prompt(cbq, 1, confirm_buy_keyboard_multi)
 
 # --------------------------
 # INIT BUY: THREE TICKETS
 # --------------------------
 @router.callback_query(F.data.startswith("init_buy_3_tickets:"))
 async def cb_init_buy_3_tickets(cbq: CallbackQuery):
-    level = cbq.data.split(":", 1)[1]
-    emoji, name = _LEVEL_EMOJIS[level], _LEVEL_NAMES[level]
-    user_id = cbq.from_user.id
-    balance = await sync_user_wallet_balance(user_id)
+    await _show_buy_prompt(cbq, 3, confirm_buy_3_keyboard_multi)
+
+# --------------------------
+# CONFIRM BUY (background purchase jobs)
+# --------------------------
+# Purchases still running per confirmation message ("chat_id:message_id"),
+# so a repeated tap on the same button never buys twice; a job is removed
+# when it finishes, as the menus later reuse the same message
+_purchase_jobs: Dict[str, asyncio.Task] = {}
+
+_PURCHASE_STAGES = {
+    "reserving": "🔒 <b>Reserving your spot…</b>",
+    "sending":   "📤 <b>Sending SOL to the pool…</b>",
+    # "confirmed" is shown by the final summary right after
+}
+
+async def _run_purchase(cbq: CallbackQuery, bot: Bot, level: str, num_tickets: int):
+    async def progress(stage: str):
+        if stage in _PURCHASE_STAGES:
+            await cbq.message.edit_text(_PURCHASE_STAGES[stage])
 
-    conn = await get_connection()
     try:
-        row = await conn.fetchrow(
-            "SELECT pool_id FROM pools WHERE status='OPEN' AND level=$1 ORDER BY pool_id LIMIT 1",
-            level
+        result = await buy_ticket(
+            cbq.from_user.id, _LEVEL_PRICES[level], level, cbq, bot,
+            num_tickets=num_tickets, progress=progress
+        )
+        if not result.get("success"):
+            return await cbq.message.edit_text(f"❌ {result['message']}", reply_markup=main_menu_keyboard())
+
+        # private confirmation
+        emoji      = _LEVEL_EMOJIS[level]
+        name       = _LEVEL_NAMES[level]
+        pool_id    = result["pool_id"]
+        spots_left = result["spots_left"]
+        pot        = result["pot"]
+        bought     = result.get("tickets_bought", num_tickets)
+        headline   = "Ticket purchased!" if bought == 1 else f"{bought} tickets purchased!"
+        await cbq.message.edit_text(
+            f"✅ <b>{headline}</b>\n"
+            f"🏷 {emoji} {name} — Pool #{pool_id}\n"
+            f"┣ 🎟 Spots left: <b>{spots_left}/{POOL_SIZE}</b>\n"
+            f"┗ 💰 Pot: <b>{pot:.2f} SOL</b>",
+            reply_markup=main_menu_keyboard()
         )
-        if not row:
-            return await cbq.message.edit_text(
-                "⛔ <b>No open pool at that level.</b>",
+
+        # announce in groups (coalesced with other purchases)
+        queue_buy_signal(level, cbq.from_user.first_name or "Player", bought, pool_id, spots_left, pot)
+    except Exception as e:
+        logging.error("purchase job for user %s failed: %s", cbq.from_user.id, e)
+        try:
+            await cbq.message.edit_text(
+                "❌ <b>Purchase failed.</b> Please try again.",
                 reply_markup=main_menu_keyboard()
             )
-        pool_id    = row["pool_id"]
-        filled     = await conn.fetchval("SELECT COUNT(*) FROM tickets WHERE pool_id=$1", pool_id)
-        spots_left = POOL_SIZE - filled
-        pot        = float(await conn.fetchval(
-            "SELECT COALESCE(SUM(value),0) FROM tickets WHERE pool_id=$1", pool_id
-        ))
-    finally:
-        await release_connection(conn)
+        except Exception as e:
+            logging.warning("could not report failed purchase to user %s: %s", cbq.from_user.id, e)
 
-    text = (
-        f"🎰 <b>Lottery Menu</b>\n"
-        f"💰 <b>Balance:</b> {balance:.4f} SOL\n\n"
-        f"🔖 <b>Tier:</b> {emoji} {name}\n"
-        f"🎟 <b>Buy 3× Tickets</b>\n"
-        f"┣ 🎟 Spots left: <b>{spots_left}/{POOL_SIZE}</b>\n"
-        f"┗ 💰 Pot: <b>{pot:.2f} SOL</b>"
-    )
-    await cbq.message.edit_text(text, reply_markup=confirm_buy_3_keyboard_multi(level))
+async def _start_purchase(cbq: CallbackQuery, bot: Bot, level: str, num_tickets: int):
+    """
+    Acknowledges the tap right away and runs the purchase in the
+    background; progress is shown by editing the confirmation message.
+    """
+    job_key = f"{cbq.message.chat.id}:{cbq.message.message_id}"
+    if job_key in _purchase_jobs:
+        return await cbq.answer("⏳ This purchase is already being processed.")
+    job = _purchase_jobs[job_key] = asyncio.create_task(_run_purchase(cbq, bot, level, num_tickets))
+    job.add_done_callback(lambda _: _purchase_jobs.pop(job_key, None))
+    await cbq.answer("⏳ Processing your purchase…")
 
 # --------------------------
 # CONFIRM BUY: SINGLE
 # --------------------------
 @router.callback_query(F.data.startswith("confirm_buy:"))
-async def cb_confirm_buy(cbq: CallbackQuery):
+async def cb_confirm_buy(cbq: CallbackQuery, bot: Bot):
     _, level, choice = cbq.data.split(":")
     if choice == "no":
+        await cbq.answer()
         return await cbq.message.edit_text("🚫 <b>Purchase cancelled.</b>", reply_markup=main_menu_keyboard())
-
-    user_id = cbq.from_user.id
-    price   = _LEVEL_PRICES[level]
-    result  = await buy_ticket(user_id, price, level, cbq, bot, num_tickets=1)
-    if not result.get("success"):
-        return await cbq.message.edit_text(f"❌ {result['message']}", reply_markup=main_menu_keyboard())
-
-    # private confirmation
-    emoji      = _LEVEL_EMOJIS[level]
-    name       = _LEVEL_NAMES[level]
-    pool_id    = result["pool_id"]
-    spots_left = result["spots_left"]
-    pot        = result["pot"]
-    await cbq.message.edit_text(
-        f"✅ <b>Ticket purchased!</b>\n"
-        f"🏷 {emoji} {name} — Pool #{pool_id}\n"
-        f"┣ 🎟 Spots left: <b>{spots_left}/{POOL_SIZE}</b>\n"
-        f"┗ 💰 Pot: <b>{pot:.2f} SOL</b>",
-        reply_markup=main_menu_keyboard()
-    )
-
-    # generate and send ticket image in groups
-    img_path = _make_ticket_image(cbq.from_user.first_name or "Player", pot)
-    photo = FSInputFile(img_path)
-
-    conn = await get_connection()
-    rows = await conn.fetch("SELECT chat_id FROM group_settings WHERE buy_signals_enabled=TRUE")
-    await release_connection(conn)
-
-    announcement = (
-        f"{cbq.from_user.first_name} just bought 1 ticket in pool {emoji} {name} "
-        f"(#{pool_id})! Spots left: {spots_left}/{POOL_SIZE} | Current pot: {pot:.2f} SOL"
-    )
-    for r in rows:
-        try:
-            await bot.send_photo(
-                chat_id=r["chat_id"],
-                photo=photo,
-                caption=announcement,
-                reply_markup=group_buy_signal_keyboard()
-            )
-        except:
-            pass
-
-    os.remove(img_path)
+    await _start_purchase(cbq, bot, level, 1)
 
 # --------------------------
 # CONFIRM BUY: THREE
 # --------------------------
 @router.callback_query(F.data.startswith("confirm_buy_3:"))
-async def cb_confirm_buy_3(cbq: CallbackQuery):
+async def cb_confirm_buy_3(cbq: CallbackQuery, bot: Bot):
     _, level, choice = cbq.data.split(":")
     if choice == "no":
+        await cbq.answer()
         return await cbq.message.edit_text("🚫 <b>Purchase cancelled.</b>", reply_markup=main_menu_keyboard())
-
-    user_id        = cbq.from_user.id
-    price          = _LEVEL_PRICES[level]
-    result         = await buy_ticket(user_id, price, level, cbq, bot, num_tickets=3)
-    if not result.get("success"):
-        return await cbq.message.edit_text(f"❌ {result['message']}", reply_markup=main_menu_keyboard())
-
-    # private confirmation
-    emoji          = _LEVEL_EMOJIS[level]
-    name           = _LEVEL_NAMES[level]
-    pool_id        = result["pool_id"]
-    spots_left     = result["spots_left"]
-    pot            = result["pot"]
-    bought         = result.get("tickets_bought", 3)
-    await cbq.message.edit_text(
-        f"✅ <b>{bought} tickets purchased!</b>\n"
-        f"🏷 {emoji} {name} — Pool #{pool_id}\n"
-        f"┣ 🎟 Spots left: <b>{spots_left}/{POOL_SIZE}</b>\n"
-        f"┗ 💰 Pot: <b>{pot:.2f} SOL</b>",
-        reply_markup=main_menu_keyboard()
-    )
-
-    # generate and send ticket image in groups
-    img_path = _make_ticket_image(cbq.from_user.first_name or "Player", pot)
-    photo = FSInputFile(img_path)
-
-    conn = await get_connection()
-    rows = await conn.fetch("SELECT chat_id FROM group_settings WHERE buy_signals_enabled=TRUE")
-    await release_connection(conn)
-
-    announcement = (
-        f"{cbq.from_user.first_name} just bought {bought} tickets in pool {emoji} {name} "
-        f"(#{pool_id})! Spots left: {spots_left}/{POOL_SIZE} | Current pot: {pot:.2f} SOL"
-    )
-    for r in rows:
-        try:
-            await bot.send_photo(
-                chat_id=r["chat_id"],
-                photo=photo,
-                caption=announcement,
-                reply_markup=group_buy_signal_keyboard()
-            )
-        except:
-            pass
-
-    os.remove(img_path)
+    await _start_purchase(cbq, bot, level, 3)
 
 # --------------------------
 # CLAIM PRIZE
@@ -615,7 +441,7 @@ async def cb_claim_ticket(cbq: CallbackQuery):
 # GROUP SIGNALS TOGGLE
 # --------------------------
 @router.message(Command("enable_signals"))
-async def cmd_enable_signals(msg: Message):
+async def cmd_enable_signals(msg: Message, bot: Bot):
     if msg.chat.type not in ("group", "supergroup"):
         return await msg.answer("⛔ This command only works in groups.")
     member = await bot.get_chat_member(msg.chat.id, msg.from_user.id)
@@ -625,7 +451,7 @@ async def cmd_enable_signals(msg: Message):
     await msg.answer("✅ <b>Buy signals ENABLED</b> for this group.")
 
 @router.message(Command("disable_signals"))
-async def cmd_disable_signals(msg: Message):
+async def cmd_disable_signals(msg: Message, bot: Bot):
     if msg.chat.type not in ("group", "supergroup"):
         return await msg.answer("⛔ This command only works in groups.")
     member = await bot.get_chat_member(msg.chat.id, msg.from_user.id)
@@ -634,39 +460,6 @@ async def cmd_disable_signals(msg: Message):
     await set_buy_signals(msg.chat.id, False)
     await msg.answer("✅ <b>Buy signals DISABLED</b> for this group.")
 
-# --------------------------
-# STATUS TEXT HELPER
-# --------------------------
-async def get_status_text(user_id: int) -> str:
-    onchain_balance = await sync_user_wallet_balance(user_id)
-    conn = await get_connection()
-    try:
-        wallet_pub = await conn.fetchval(
-            "SELECT wallet_public_key FROM users WHERE user_id = $1",
-            user_id
-        ) or "No wallet"
-        lines = [
-            f"💼 <b>Wallet</b>: <code>{wallet_pub}</code>",
-            f"💰 <b>Balance</b>: {onchain_balance:.4f} SOL",
-            "",
-            "🎰 <b>Current Pools</b>:"
-        ]
-        for level in _LEVELS:
-            pool_row = await conn.fetchrow(
-                "SELECT pool_id FROM pools WHERE status='OPEN' AND level = $1 ORDER BY pool_id LIMIT 1",
-                level
-            )
-            if pool_row:
-                pid = pool_row["pool_id"]
-                count = await conn.fetchval("SELECT COUNT(*) FROM tickets WHERE pool_id=$1", pid)
-                pot = await conn.fetchval("SELECT COALESCE(SUM(value),0) FROM tickets WHERE pool_id=$1", pid)
-                lines.append(f"{_LEVEL_EMOJIS[level]} <b>{_LEVEL_NAMES[level]}</b> — {count}/{POOL_SIZE} tickets, pot {pot:.2f} SOL")
-            else:
-                lines.append(f"{_LEVEL_EMOJIS[level]} <b>{_LEVEL_NAMES[level]}</b> — No open pool")
-        return "\n".join(lines)
-    finally:
-        await release_connection(conn)
-
 # --------------------------
 # WITHDRAW FLOW
 # --------------------------
@@ -696,19 +489,12 @@ async def process_withdraw_address(msg: Message, state: FSMContext):
         return await msg.answer("⛔ <b>Invalid address length.</b> Enter a valid Solana address or /cancel.")
 
     data = await state.get_data()
-    conn = await get_connection()
-    try:
-        row = await conn.fetchrow(
-            "SELECT wallet_public_key FROM users WHERE user_id=$1",
-            msg.from_user.id
-        )
-    finally:
-        await release_connection(conn)
-
-    user_pub = row["wallet_public_key"] if row else None
+    profile = await get_user_profile(msg.from_user.id)
+    user_pub = profile["wallet_public_key"] if profile else None
     if addr == user_pub:
         return await msg.answer("⛔ <b>Cannot withdraw to your own wallet address.</b> Enter a different address or /cancel.")
 
+    from solders.pubkey import Pubkey
     try:
         _ = Pubkey.from_string(addr)
     except:
@@ -735,34 +521,31 @@ async def process_withdraw_amount(msg: Message, state: FSMContext):
     await finalize_withdraw(msg, state)
 
 async def finalize_withdraw(msg: Message, state: FSMContext):
+    """
+    Queues the withdrawal and returns; withdrawals.py sends it and
+    messages the user once it is confirmed or failed.
+    """
     data = await state.get_data()
     recipient = data["recipient_address"]
     req = data["requested_amount"]
 
-    conn = await get_connection()
-    try:
-        row = await conn.fetchrow(
-            "SELECT wallet_public_key, wallet_private_key FROM users WHERE user_id=$1",
-            msg.from_user.id
-        )
-    finally:
-        await release_connection(conn)
-
-    if not row or not row["wallet_public_key"]:
+    profile = await get_user_profile(msg.from_user.id)
+    if not profile or not profile["wallet_public_key"]:
         await msg.answer("⚠️ <b>No wallet found. Use /start.</b>", reply_markup=main_menu_keyboard())
         return await state.clear()
 
-    user_pubkey, priv = row["wallet_public_key"], row["wallet_private_key"]
-    from solana_utils import get_wallet_balance, pay_sol
-    balance = await get_wallet_balance(user_pubkey)
-
-    amount = balance - 0.001 if req == "all" else float(req)
-    if amount > balance:
-        return await msg.answer(f"⛔ <b>Insufficient funds:</b> {balance:.4f} SOL")
+    amount = None if req == "all" else float(req)
+    if amount is not None and amount <= 0:
+        return await msg.answer("⛔ <b>Amount must be positive.</b> Enter a number or 'all', or /cancel.")
 
     try:
-        sig = await pay_sol(priv, user_pubkey, recipient, amount)
-        await msg.answer(f"🚀 <b>Withdrawn {amount:.4f} SOL</b>\nTx: https://solscan.io/tx/{sig}", reply_markup=main_menu_keyboard())
+        withdrawal_id = await enqueue_withdrawal(msg.from_user.id, msg.chat.id, recipient, amount)
+        await msg.answer(
+            f"🕒 <b>Withdrawal #{withdrawal_id} queued</b> "
+            f"({'all funds' if amount is None else f'{amount:.4f} SOL'}).\n"
+            f"You'll get a message as soon as it settles.",
+            reply_markup=main_menu_keyboard()
+        )
     except Exception as e:
         await msg.answer(f"❌ <b>Withdrawal failed:</b> {e}")
     finally:
@@ -774,25 +557,13 @@ async def finalize_withdraw(msg: Message, state: FSMContext):
 @router.callback_query(F.data == "menu_stats")
 async def cb_menu_stats(cbq: CallbackQuery):
     user_id = cbq.from_user.id
-    conn = await get_connection()
-    try:
-        total = await conn.fetchrow("""
-            SELECT COUNT(*) AS total_tickets,
-                   COALESCE(SUM(value),0) AS total_spent,
-                   COALESCE(SUM(prize_amount),0) AS total_won,
-                   SUM(CASE WHEN status='won' THEN 1 ELSE 0 END) AS total_wins
-            FROM tickets WHERE user_id=$1
-        """, user_id)
-        per_level = await conn.fetch("""
-            SELECT level,
-                   COUNT(*) AS tickets,
-                   COALESCE(SUM(value),0) AS spent,
-                   COALESCE(SUM(prize_amount),0) AS won,
-                   SUM(CASE WHEN status='won' THEN 1 ELSE 0 END) AS wins
-            FROM tickets WHERE user_id=$1 GROUP BY level
-        """, user_id)
-    finally:
-        await release_connection(conn)
+    per_level = await get_user_level_stats(user_id)
+    total = {
+        "total_tickets": sum(r["tickets"] for r in per_level),
+        "total_spent":   sum(r["spent"] for r in per_level),
+        "total_won":     sum(r["won"] for r in per_level),
+        "total_wins":    sum(r["wins"] for r in per_level),
+    }
 
     lines = [
         "📊 <b>Your Stats</b>",
@@ -834,14 +605,7 @@ async def cb_stats_back_main(cbq: CallbackQuery):
 @router.callback_query(F.data == "menu_history")
 async def cb_menu_history(cbq: CallbackQuery):
     user_id = cbq.from_user.id
-    conn = await get_connection()
-    try:
-        rows = await conn.fetch("""
-            SELECT pool_id, level, status='won' AS is_winner, prize_amount, created_at
-            FROM tickets WHERE user_id=$1 ORDER BY created_at DESC LIMIT 10
-        """, user_id)
-    finally:
-        await release_connection(conn)
+    rows = await get_user_history(user_id, limit=10)
 
     if not rows:
         return await cbq.message.edit_text("📜 <b>No history yet!</b>\nPlay to see your past tickets.", reply_markup=history_keyboard())
@@ -850,8 +614,9 @@ async def cb_menu_history(cbq: CallbackQuery):
     for t in rows:
         emoji = _LEVEL_EMOJIS.get(t["level"], "")
         name  = _LEVEL_NAMES.get(t["level"], t["level"])
-        outcome = "✅ <b>WIN</b>" if t["is_winner"] else "❌ <b>Lost</b>"
-        prize   = f"{t['prize_amount']:.2f} SOL" if t["is_winner"] else "-"
+        is_winner = t["status"] == "won"
+        outcome = "✅ <b>WIN</b>" if is_winner else "❌ <b>Lost</b>"
+        prize   = f"{t['prize_amount']:.2f} SOL" if is_winner else "-"
         ts = t["created_at"].strftime("%Y-%m-%d %H:%M")
         lines.append(f"{emoji} <b>{name}</b> | Pool #{t['pool_id']} | {outcome} | Prize: {prize}\n<i>{ts}</i>")
 
@@ -895,10 +660,10 @@ async def cmd_reset(msg: Message):
         return await msg.reply("⛔ You’re not authorized to do that.")
     conn = await get_connection()
     try:
-        await conn.execute("DELETE FROM tickets")
+        await conn.execute("TRUNCATE tickets, tickets_archive, user_ticket_stats")
         await conn.execute("DELETE FROM pools")
         for lvl in _LEVELS:
-            await conn.execute("INSERT INTO pools (level, status) VALUES ($1, 'OPEN')", lvl)
+            await open_new_pool(conn, lvl)
     finally:
         await release_connection(conn)
     await msg.reply("✅ All pools and tickets reset. New OPEN pools ready!")
@@ -5,6 +5,8 @@ load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 DATABASE_URL = os.getenv("DATABASE_URL", "")
+# Optional streaming replica for read-only queries (stats, history, pool summaries)
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL", "")
 
 DEV_WALLET = os.getenv("DEV_WALLET", "")
 HOUSE_WALLET = os.getenv("HOUSE_WALLET", "")
@@ -16,6 +18,29 @@ SOLANA_RPC_ENDPOINT = os.getenv("SOLANA_RPC_ENDPOINT", "https://api.mainnet-beta
 POOL_TICKET_PRICE = float(os.getenv("POOL_TICKET_PRICE", "0.1"))
 POOL_SIZE = int(os.getenv("POOL_SIZE", "20"))
 
+# Optional tablespace (e.g. on cheaper/compressed storage) for archived ticket partitions
+ARCHIVE_TABLESPACE = os.getenv("ARCHIVE_TABLESPACE", "")
+
+# "polling" (single process) or "webhook" (aiohttp front + sharded worker processes)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")          # public https base url, e.g. https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", str(os.cpu_count() or 1)))
+
+# Prometheus endpoint on 127.0.0.1; 0 disables it. Webhook workers use METRICS_PORT + worker index.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+# Opt-in: append anonymized incoming updates to this file (see update_recorder.py)
+RECORD_UPDATES = os.getenv("RECORD_UPDATES", "")
+RECORD_UPDATES_SALT = os.getenv("RECORD_UPDATES_SALT", "")   # HMAC key for the pseudonyms; BOT_TOKEN when empty
+
+# Opt-in trace spans (see tracing.py): a JSONL file and/or an OTLP/HTTP collector, e.g. http://127.0.0.1:4318
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")
+
 GROUP_CHAT_ID = int(os.getenv("GROUP_CHAT_ID", "0"))
 BOT_USERNAME = os.getenv("BOT_USERNAME", "TestServ123_Bot")
 
@@ -50,5 +75,9 @@ if not POOL_PUBLIC_KEY:
     raise ValueError("Missing POOL_PUBLIC_KEY in .env")
 if not POOL_PRIVATE_KEY:
     raise ValueError("Missing POOL_PRIVATE_KEY in .env")
+if BOT_MODE not in ("polling", "webhook"):
+    raise ValueError("BOT_MODE must be 'polling' or 'webhook'")
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    raise ValueError("Missing WEBHOOK_URL in .env")
 if not BOT_USERNAME:
     raise ValueError("Missing BOT_USERNAME in .env")
\ No newline at end of file
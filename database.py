@@ -1,95 +1,556 @@
 ﻿import base58
+import json
+import asyncpg
 from typing import Optional, List, Dict
 
 from config import DATABASE_URL, _LEVELS
-from solders.keypair import Keypair
 from global_pool import get_connection, release_connection
+from cache_utils import LRUCache
+from update_scope import memoized, forget
+from keypair_pool import assign_reserved_wallet, request_refill, RESERVE_KEYPAIR_CTE
 
-async def init_db():
+# level, pool_id, count, pot of the OPEN pool per level (lowest pool_id wins).
+# LATERAL keeps the ticket lookups pruned to the pool's own partition.
+_OPEN_POOL_SUMMARY_SQL = """
+    SELECT p.level, p.pool_id, s.count, s.pot
+      FROM (SELECT DISTINCT ON (level) level, pool_id
+              FROM pools WHERE status='OPEN'
+             ORDER BY level, pool_id) p
+     CROSS JOIN LATERAL (
+            SELECT COUNT(*)::INT AS count, COALESCE(SUM(value), 0) AS pot
+              FROM tickets t WHERE t.pool_id = p.pool_id
+           ) s
+"""
+
+# Bounded per-process cache of the hot `users` columns, keyed by user_id
+PROFILE_CACHE_SIZE = 10_000
+_profile_cache = LRUCache(PROFILE_CACHE_SIZE)
+
+# Bump whenever the DDL in _apply_schema changes
+SCHEMA_VERSION = 7
+
+async def init_db() -> bool:
+    """
+    Brings the schema to SCHEMA_VERSION and ensures one OPEN pool per level.
+    When the stored version already matches, no DDL runs at all: startup
+    costs one version lookup plus one set-based pool check. A newer stored
+    version (rollback, or a mixed rolling deploy) is left alone, so an old
+    binary never re-runs its DDL over the newer schema.
+    Returns True if the schema had to be (re)applied.
+    """
+    applied = False
+    conn = await get_connection()
+    try:
+        if _schema_outdated(await _stored_schema_version(conn)):
+            async with conn.transaction():
+                # Serialize concurrent boots (rolling restarts) on the DDL
+                await conn.execute("SELECT pg_advisory_xact_lock(hashtext('luckysol_schema'))")
+                if _schema_outdated(await _stored_schema_version(conn)):
+                    await _apply_schema(conn)
+                    await conn.execute(
+                        """
+                        INSERT INTO schema_version (id, version) VALUES (1, $1)
+                        ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, applied_at = NOW()
+                        """,
+                        SCHEMA_VERSION
+                    )
+                    applied = True
+
+        # Partitions for any pools created below exist before those pools do
+        last_pool_id = await conn.fetchval(
+            "SELECT pg_sequence_last_value(pg_get_serial_sequence('pools', 'pool_id')::regclass)"
+        ) or 0
+        await ensure_ticket_partition(conn, last_pool_id + 1)
+        await ensure_ticket_partition(conn, last_pool_id + len(_LEVELS) + TICKET_PARTITION_LEAD)
+
+        # Ensure one OPEN pool per level, and report which open pools
+        # still lack a tickets partition
+        rows = await conn.fetch(
+            """
+            WITH created AS (
+                INSERT INTO pools (level, status)
+                SELECT lvl, 'OPEN' FROM unnest($1::text[]) AS lvl
+                 WHERE NOT EXISTS (SELECT 1 FROM pools WHERE status='OPEN' AND level=lvl)
+                RETURNING pool_id
+            )
+            SELECT pool_id,
+                   to_regclass('tickets_p' || (pool_id / $2) * $2) IS NOT NULL AS has_partition
+              FROM (SELECT pool_id FROM created
+                    UNION ALL
+                    SELECT pool_id FROM pools WHERE status='OPEN') open_pools
+            """,
+            _LEVELS, TICKET_PARTITION_SPAN
+        )
+        for r in rows:
+            if r["has_partition"]:
+                _known_partitions.add(ticket_partition_bounds(r["pool_id"])[0])
+            else:
+                await ensure_ticket_partition(conn, r["pool_id"])
+    finally:
+        await release_connection(conn)
+    return applied
+
+def _schema_outdated(stored: Optional[int]) -> bool:
+    if stored is not None and stored > SCHEMA_VERSION:
+        print(f"[db] Schema version {stored} is newer than this build's {SCHEMA_VERSION}; not applying DDL.")
+        return False
+    return stored is None or stored < SCHEMA_VERSION
+
+async def _stored_schema_version(conn) -> Optional[int]:
+    query = "SELECT version FROM schema_version WHERE id = 1"
+    try:
+        if conn.is_in_transaction():
+            # savepoint, so a missing table does not abort the outer transaction
+            async with conn.transaction():
+                return await conn.fetchval(query)
+        return await conn.fetchval(query)
+    except asyncpg.UndefinedTableError:
+        return None
+
+async def _apply_schema(conn) -> None:
     """
     Creates necessary tables if they do not exist and ensures schema is up-to-date.
       - users: user data + referral columns
       - pools: each lottery round, keyed by stake level
-      - tickets: tickets including stake level and status
+      - tickets: tickets including stake level and status, partitioned by pool_id
+      - user_ticket_stats: per-user totals of settled tickets
+      - notify_pool_state triggers feeding pool_state.py
+      - wallet_reservoir: pre-generated keypairs for new users
       - group_settings: per-group config
-    Ensures at least one OPEN pool exists per level.
+      - fsm_storage: aiogram FSM state/data, see pg_storage.py
+      - withdrawals: queued user withdrawals, see withdrawals.py
+      - ledger_entries: append-only record of every balance-affecting event,
+        with per-user running totals in ledger_totals
     """
-    conn = await get_connection()
-    try:
-        # ---------------- USERS ----------------
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id             BIGINT PRIMARY KEY,
-            username            TEXT,
-            first_name          TEXT,
-            has_seen_disclaimer BOOLEAN DEFAULT FALSE,
-            balance             DOUBLE PRECISION DEFAULT 0,
-            total_wins          INT    DEFAULT 0,
-            wallet_public_key   TEXT,
-            wallet_private_key  TEXT,
-            referred_by         BIGINT,
-            referral_earnings   DOUBLE PRECISION DEFAULT 0
-        );
-        """)
+    # ------------- SCHEMA VERSION -------------
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        id         INT PRIMARY KEY,
+        version    INT NOT NULL,
+        applied_at TIMESTAMP DEFAULT NOW()
+    );
+    """)
 
-        # ---------------- POOLS ----------------
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS pools (
-            pool_id               SERIAL PRIMARY KEY,
-            level                 TEXT NOT NULL,
-            status                TEXT DEFAULT 'OPEN',
-            created_at            TIMESTAMP DEFAULT NOW(),
-            completed_at          TIMESTAMP,
-            total_pot             DOUBLE PRECISION DEFAULT 0,
-            house_fee_tx          TEXT,
-            dev_fee_tx            TEXT,
-            first_winner_user_id  BIGINT,
-            second_winner_user_id BIGINT,
-            third_winner_user_id  BIGINT
-        );
-        """)
+    # ---------------- USERS ----------------
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id             BIGINT PRIMARY KEY,
+        username            TEXT,
+        first_name          TEXT,
+        has_seen_disclaimer BOOLEAN DEFAULT FALSE,
+        balance             DOUBLE PRECISION DEFAULT 0,
+        total_wins          INT    DEFAULT 0,
+        wallet_public_key   TEXT,
+        wallet_private_key  TEXT,
+        referred_by         BIGINT,
+        referral_earnings   DOUBLE PRECISION DEFAULT 0
+    );
+    """)
 
-        # -------------- TICKETS --------------
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS tickets (
-            ticket_id     SERIAL PRIMARY KEY,
-            pool_id       INT REFERENCES pools(pool_id),
+    # ---------------- POOLS ----------------
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS pools (
+        pool_id               SERIAL PRIMARY KEY,
+        level                 TEXT NOT NULL,
+        status                TEXT DEFAULT 'OPEN',
+        created_at            TIMESTAMP DEFAULT NOW(),
+        completed_at          TIMESTAMP,
+        total_pot             DOUBLE PRECISION DEFAULT 0,
+        house_fee_tx          TEXT,
+        dev_fee_tx            TEXT,
+        first_winner_user_id  BIGINT,
+        second_winner_user_id BIGINT,
+        third_winner_user_id  BIGINT
+    );
+    """)
+
+    # ---------- PER-USER TICKET AGGREGATES ----------
+    # Totals of settled (drawn) tickets, rolled up by run_lottery
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_ticket_stats (
+        user_id  BIGINT NOT NULL,
+        level    TEXT   NOT NULL,
+        tickets  INT    NOT NULL DEFAULT 0,
+        spent    DOUBLE PRECISION NOT NULL DEFAULT 0,
+        won      DOUBLE PRECISION NOT NULL DEFAULT 0,
+        wins     INT    NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, level)
+    );
+    """)
+
+    # -------------- TICKETS --------------
+    # Range-partitioned by pool_id; settled ranges are moved to
+    # tickets_archive by archival.py. A pre-partitioning `tickets`
+    # table is migrated in place.
+    kind = await conn.fetchval(
+        "SELECT relkind::text FROM pg_class WHERE oid = to_regclass('tickets')"
+    )
+    if kind == "r":
+        await _migrate_legacy_tickets(conn)
+    else:
+        await _create_ticket_tables(conn)
+
+    # ---------- POOL STATE NOTIFICATIONS ----------
+    # Every ticket insert and pool open/close notifies channel `pool_state`
+    # with the level; pool_state.py keeps its snapshot fresh from these.
+    # Postgres folds identical notifications within one transaction.
+    await conn.execute("""
+    CREATE OR REPLACE FUNCTION notify_pool_state() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('pool_state', NEW.level);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS tickets_pool_state ON tickets;
+    CREATE TRIGGER tickets_pool_state AFTER INSERT ON tickets
+        FOR EACH ROW EXECUTE FUNCTION notify_pool_state();
+
+    DROP TRIGGER IF EXISTS pools_pool_state ON pools;
+    CREATE TRIGGER pools_pool_state AFTER INSERT OR UPDATE OF status ON pools
+        FOR EACH ROW EXECUTE FUNCTION notify_pool_state();
+    """)
+
+    # ---------- WALLET RESERVOIR ----------
+    # Pre-generated keypairs handed out by keypair_pool.assign_reserved_wallet
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS wallet_reservoir (
+        id          BIGSERIAL PRIMARY KEY,
+        public_key  TEXT NOT NULL,
+        private_key TEXT NOT NULL
+    );
+    """)
+
+    # -------------- GROUP SETTINGS ---------
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS group_settings (
+        chat_id             BIGINT PRIMARY KEY,
+        buy_signals_enabled BOOLEAN DEFAULT TRUE
+    );
+    """)
+
+    # -------------- FSM STORAGE ------------
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS fsm_storage (
+        key        TEXT PRIMARY KEY,
+        state      TEXT,
+        data       JSONB NOT NULL DEFAULT '{}',
+        updated_at TIMESTAMP DEFAULT NOW()
+    );
+    """)
+
+    # -------------- WITHDRAWALS ------------
+    # pending -> processing -> sent -> confirmed | failed | expired
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS withdrawals (
+        id         BIGSERIAL PRIMARY KEY,
+        user_id    BIGINT NOT NULL,
+        chat_id    BIGINT NOT NULL,
+        recipient  TEXT   NOT NULL,
+        amount     DOUBLE PRECISION,          -- NULL = whole balance
+        status     TEXT   NOT NULL DEFAULT 'pending',
+        signature  TEXT,
+        error      TEXT,
+        created_at TIMESTAMP DEFAULT NOW(),
+        sent_at    TIMESTAMP,
+        settled_at TIMESTAMP
+    );
+    -- the transfer can no longer land once the chain is past this height
+    ALTER TABLE withdrawals ADD COLUMN IF NOT EXISTS last_valid_block_height BIGINT;
+    -- lease on a 'processing' row: which instance is sending it, since when
+    ALTER TABLE withdrawals ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+    ALTER TABLE withdrawals ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
+    CREATE INDEX IF NOT EXISTS idx_withdrawals_open
+        ON withdrawals (status, id) WHERE status IN ('pending', 'processing', 'sent');
+    """)
+
+    # ---------------- LEDGER ----------------
+    # kind: ticket_purchase | prize | referral_bonus | withdrawal | house_fee | dev_fee
+    # amount is signed from the user's side (purchases and withdrawals are
+    # negative); fees have no user_id and a positive amount out of the pot.
+    # Rows are never updated or deleted.
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_entries (
+        id         BIGSERIAL PRIMARY KEY,
+        user_id    BIGINT,
+        kind       TEXT NOT NULL,
+        amount     DOUBLE PRECISION NOT NULL,
+        pool_id    INT,
+        recipient  TEXT,
+        signature  TEXT,
+        created_at TIMESTAMP DEFAULT NOW()
+    );
+    CREATE INDEX IF NOT EXISTS idx_ledger_user ON ledger_entries (user_id, id);
+    CREATE INDEX IF NOT EXISTS idx_ledger_pool ON ledger_entries (pool_id) WHERE pool_id IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS idx_ledger_signature ON ledger_entries (signature) WHERE signature IS NOT NULL;
+
+    CREATE OR REPLACE FUNCTION ledger_entries_append_only() RETURNS trigger AS $$
+    BEGIN
+        RAISE EXCEPTION 'ledger_entries is append-only';
+    END
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS ledger_entries_no_change ON ledger_entries;
+    CREATE TRIGGER ledger_entries_no_change BEFORE UPDATE OR DELETE ON ledger_entries
+        FOR EACH ROW EXECUTE FUNCTION ledger_entries_append_only();
+    DROP TRIGGER IF EXISTS ledger_entries_no_truncate ON ledger_entries;
+    CREATE TRIGGER ledger_entries_no_truncate BEFORE TRUNCATE ON ledger_entries
+        FOR EACH STATEMENT EXECUTE FUNCTION ledger_entries_append_only();
+
+    CREATE TABLE IF NOT EXISTS ledger_totals (
+        user_id       BIGINT PRIMARY KEY,
+        spent         DOUBLE PRECISION NOT NULL DEFAULT 0,
+        won           DOUBLE PRECISION NOT NULL DEFAULT 0,
+        referral      DOUBLE PRECISION NOT NULL DEFAULT 0,
+        withdrawn     DOUBLE PRECISION NOT NULL DEFAULT 0,
+        net           DOUBLE PRECISION NOT NULL DEFAULT 0,
+        entries       BIGINT NOT NULL DEFAULT 0,
+        last_entry_id BIGINT NOT NULL DEFAULT 0,
+        updated_at    TIMESTAMP DEFAULT NOW()
+    );
+
+    -- One upsert per user per inserting statement, from the transition table
+    CREATE OR REPLACE FUNCTION ledger_totals_apply() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO ledger_totals AS t (user_id, spent, won, referral, withdrawn, net, entries, last_entry_id)
+        SELECT user_id,
+               COALESCE(-SUM(amount) FILTER (WHERE kind = 'ticket_purchase'), 0),
+               COALESCE(SUM(amount)  FILTER (WHERE kind = 'prize'), 0),
+               COALESCE(SUM(amount)  FILTER (WHERE kind = 'referral_bonus'), 0),
+               COALESCE(-SUM(amount) FILTER (WHERE kind = 'withdrawal'), 0),
+               SUM(amount), COUNT(*), MAX(id)
+          FROM new_entries
+         WHERE user_id IS NOT NULL
+         GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE
+          SET spent         = t.spent     + EXCLUDED.spent,
+              won           = t.won       + EXCLUDED.won,
+              referral      = t.referral  + EXCLUDED.referral,
+              withdrawn     = t.withdrawn + EXCLUDED.withdrawn,
+              net           = t.net       + EXCLUDED.net,
+              entries       = t.entries   + EXCLUDED.entries,
+              last_entry_id = GREATEST(t.last_entry_id, EXCLUDED.last_entry_id),
+              updated_at    = NOW();
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS ledger_entries_totals ON ledger_entries;
+    CREATE TRIGGER ledger_entries_totals AFTER INSERT ON ledger_entries
+        REFERENCING NEW TABLE AS new_entries
+        FOR EACH STATEMENT EXECUTE FUNCTION ledger_totals_apply();
+    """)
+    await _backfill_ledger(conn)
+
+async def _backfill_ledger(conn) -> None:
+    """
+    Seeds an empty ledger from the history that predates it: purchases
+    per user and pool, prizes paid to a wallet with their draw's batch
+    signature (like run_lottery, walletless winners get none), referral
+    earnings so far as one opening entry per referrer, and confirmed
+    withdrawals. Past house/dev fees only exist as pool totals and are
+    not reconstructed.
+    """
+    if await conn.fetchval("SELECT EXISTS (SELECT 1 FROM ledger_entries)"):
+        return
+    await conn.execute("""
+    WITH all_tickets AS (
+        SELECT pool_id, user_id, value, status, prize_amount, created_at
+          FROM tickets WHERE is_confirmed = TRUE
+        UNION ALL
+        SELECT pool_id, user_id, value, status, prize_amount, created_at
+          FROM tickets_archive WHERE is_confirmed = TRUE
+    )
+    INSERT INTO ledger_entries (user_id, kind, amount, pool_id, recipient, signature, created_at)
+    SELECT user_id, 'ticket_purchase', -SUM(value), pool_id, NULL, NULL, MIN(created_at)
+      FROM all_tickets
+     GROUP BY user_id, pool_id
+    UNION ALL
+    SELECT t.user_id, 'prize', t.prize_amount, t.pool_id, u.wallet_public_key,
+           regexp_replace(p.house_fee_tx, '^batch:', ''), p.completed_at
+      FROM all_tickets t
+      JOIN pools p ON p.pool_id = t.pool_id
+      JOIN users u ON u.user_id = t.user_id
+     WHERE t.status = 'won' AND t.prize_amount > 0
+       AND u.wallet_public_key IS NOT NULL
+    UNION ALL
+    SELECT user_id, 'referral_bonus', referral_earnings, NULL, NULL, NULL, NOW()
+      FROM users WHERE referral_earnings > 0
+    UNION ALL
+    SELECT user_id, 'withdrawal', -amount, NULL, recipient, signature, settled_at
+      FROM withdrawals WHERE status = 'confirmed'
+     ORDER BY 7;
+    """)
+
+# ============================
+#      TICKET PARTITIONS
+# ============================
+
+# Each tickets partition covers this many consecutive pool_ids
+TICKET_PARTITION_SPAN = 1000
+# The next partition is created this many pools before it is needed
+TICKET_PARTITION_LEAD = 50
+
+# Lower bounds of partitions this process has already ensured
+_known_partitions = set()
+
+_TICKET_COLUMNS = """
+            ticket_id     SERIAL,
+            pool_id       INT NOT NULL REFERENCES pools(pool_id),
             user_id       BIGINT,
             level         TEXT NOT NULL,
             value         DOUBLE PRECISION,
             status        TEXT NOT NULL DEFAULT 'not_drawn',  -- 'not_drawn', 'won', or 'lost'
             prize_amount  DOUBLE PRECISION DEFAULT 0,
             is_confirmed  BOOLEAN DEFAULT TRUE,
-            created_at    TIMESTAMP DEFAULT NOW()
-        );
-        """)
+            created_at    TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (pool_id, ticket_id)
+"""
+
+def ticket_partition_bounds(pool_id: int) -> tuple:
+    lo = (pool_id // TICKET_PARTITION_SPAN) * TICKET_PARTITION_SPAN
+    return lo, lo + TICKET_PARTITION_SPAN
+
+async def _create_ticket_tables(conn) -> None:
+    await conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS tickets ({_TICKET_COLUMNS}) PARTITION BY RANGE (pool_id);
+    CREATE INDEX IF NOT EXISTS tickets_user_created_idx ON tickets (user_id, created_at DESC);
+
+    CREATE TABLE IF NOT EXISTS tickets_archive (LIKE tickets) PARTITION BY RANGE (pool_id);
+    CREATE INDEX IF NOT EXISTS tickets_archive_user_created_idx
+        ON tickets_archive (user_id, created_at DESC);
+    """)
 
-        # -------------- GROUP SETTINGS ---------
+async def ensure_ticket_partition(conn, pool_id: int) -> None:
+    """
+    Creates the hot tickets partition that will hold `pool_id`, if missing.
+    Must run before the first ticket of a new pool is inserted.
+    """
+    lo, hi = ticket_partition_bounds(pool_id)
+    if lo in _known_partitions:
+        return
+    await conn.execute(
+        f"CREATE TABLE IF NOT EXISTS tickets_p{lo} PARTITION OF tickets "
+        f"FOR VALUES FROM ({lo}) TO ({hi})"
+    )
+    _known_partitions.add(lo)
+
+async def open_new_pool(conn, level: str) -> int:
+    """
+    Opens a pool only once the partition for its tickets exists, so no
+    buyer can find an OPEN pool whose ticket INSERT would fail. Near the
+    end of a range the next partition is created ahead of time.
+    """
+    pool_id = await conn.fetchval("SELECT nextval(pg_get_serial_sequence('pools', 'pool_id'))")
+    await ensure_ticket_partition(conn, pool_id)
+    await ensure_ticket_partition(conn, pool_id + TICKET_PARTITION_LEAD)
+    await conn.execute(
+        "INSERT INTO pools (pool_id, level, status) VALUES ($1, $2, 'OPEN')",
+        pool_id, level
+    )
+    return pool_id
+
+async def _migrate_legacy_tickets(conn) -> None:
+    """
+    One-off conversion of the original unpartitioned tickets table:
+    copies every ticket into pool_id partitions, keeps ticket ids, and
+    seeds user_ticket_stats from the tickets that were already drawn.
+    """
+    async with conn.transaction():
         await conn.execute("""
-        CREATE TABLE IF NOT EXISTS group_settings (
-            chat_id             BIGINT PRIMARY KEY,
-            buy_signals_enabled BOOLEAN DEFAULT TRUE
-        );
+        ALTER TABLE tickets RENAME TO tickets_legacy;
+        ALTER TABLE tickets_legacy RENAME CONSTRAINT tickets_pkey TO tickets_legacy_pkey;
+        ALTER SEQUENCE IF EXISTS tickets_ticket_id_seq RENAME TO tickets_legacy_ticket_id_seq;
         """)
+        await _create_ticket_tables(conn)
+        spans = await conn.fetch(
+            "SELECT DISTINCT pool_id / $1 AS span FROM tickets_legacy WHERE pool_id IS NOT NULL",
+            TICKET_PARTITION_SPAN
+        )
+        for r in spans:
+            await ensure_ticket_partition(conn, r["span"] * TICKET_PARTITION_SPAN)
+        await conn.execute("""
+        INSERT INTO tickets (ticket_id, pool_id, user_id, level, value, status,
+                             prize_amount, is_confirmed, created_at)
+        SELECT ticket_id, pool_id, user_id, level, value, status,
+               prize_amount, is_confirmed, created_at
+          FROM tickets_legacy
+         WHERE pool_id IS NOT NULL;
 
-        # Ensure one OPEN pool per level
-        for lvl in _LEVELS:
-            row = await conn.fetchrow(
-                "SELECT pool_id FROM pools WHERE status='OPEN' AND level=$1 LIMIT 1",
-                lvl
-            )
-            if not row:
-                await conn.execute(
-                    "INSERT INTO pools (level, status) VALUES ($1, 'OPEN')",
-                    lvl
-                )
-    finally:
-        await release_connection(conn)
+        SELECT setval('tickets_ticket_id_seq',
+                      COALESCE((SELECT MAX(ticket_id) FROM tickets_legacy), 0) + 1, false);
+
+        INSERT INTO user_ticket_stats (user_id, level, tickets, spent, won, wins)
+        SELECT t.user_id, t.level, COUNT(*), COALESCE(SUM(t.value), 0),
+               COALESCE(SUM(t.prize_amount), 0), COUNT(*) FILTER (WHERE t.status = 'won')
+          FROM tickets t
+          JOIN pools p ON p.pool_id = t.pool_id
+         WHERE p.status = 'CLOSED' AND t.is_confirmed = TRUE
+         GROUP BY t.user_id, t.level
+        ON CONFLICT (user_id, level) DO NOTHING;
+
+        DROP TABLE tickets_legacy;
+        """)
+
+async def rollup_pool_stats(conn, pool_id: int) -> None:
+    """
+    Adds a freshly drawn pool's tickets to user_ticket_stats.
+    Call inside the draw transaction, after winners are marked.
+    """
+    await conn.execute(
+        """
+        INSERT INTO user_ticket_stats AS s (user_id, level, tickets, spent, won, wins)
+        SELECT user_id, level, COUNT(*), COALESCE(SUM(value), 0),
+               COALESCE(SUM(prize_amount), 0), COUNT(*) FILTER (WHERE status = 'won')
+          FROM tickets
+         WHERE pool_id = $1 AND is_confirmed = TRUE
+         GROUP BY user_id, level
+        ON CONFLICT (user_id, level) DO UPDATE
+          SET tickets = s.tickets + EXCLUDED.tickets,
+              spent   = s.spent   + EXCLUDED.spent,
+              won     = s.won     + EXCLUDED.won,
+              wins    = s.wins    + EXCLUDED.wins
+        """,
+        pool_id
+    )
 
 # ============================
 #         USER HELPERS
 # ============================
 
+async def get_user_profile(user_id: int) -> Optional[Dict]:
+    """
+    Returns username, first_name, has_seen_disclaimer, wallet_public_key and
+    the last stored balance for a user, served from the in-process LRU cache
+    when possible. Returns None for unknown users (not cached).
+    """
+    profile = _profile_cache.get(user_id)
+    if profile is not None:
+        return profile
+    return await memoized(("profile", user_id), _fetch_user_profile, user_id)
+
+async def _fetch_user_profile(user_id: int) -> Optional[Dict]:
+    conn = await get_connection()
+    try:
+        row = await conn.fetchrow(
+            """
+            SELECT username, first_name, has_seen_disclaimer, wallet_public_key, balance
+              FROM users WHERE user_id=$1
+            """,
+            user_id
+        )
+    finally:
+        await release_connection(conn)
+    if not row:
+        return None
+    profile = dict(row)
+    _profile_cache.put(user_id, profile)
+    return profile
+
+def invalidate_user_profile(user_id: int) -> None:
+    _profile_cache.pop(user_id)
+    forget(("profile", user_id))
+
 async def create_or_update_user(
     user_id: int,
     username: str,
@@ -110,17 +571,48 @@ async def create_or_update_user(
         )
     finally:
         await release_connection(conn)
+    invalidate_user_profile(user_id)
 
-async def has_seen_disclaimer(user_id: int) -> bool:
+async def onboard_user(
+    user_id: int,
+    username: str,
+    first_name: str,
+    referred_by: Optional[int] = None
+) -> Dict:
+    """
+    /start in one round trip: upserts the user and returns its profile
+    together with the open-pool summary for every level.
+    Returns {"profile": {...}, "pools": {level: {"pool_id", "count", "pot"}}}.
+    """
     conn = await get_connection()
     try:
         row = await conn.fetchrow(
-            "SELECT has_seen_disclaimer FROM users WHERE user_id=$1",
-            user_id
+            f"""
+            WITH u AS (
+                INSERT INTO users (user_id, username, first_name, referred_by)
+                     VALUES ($1, $2, $3, $4)
+                ON CONFLICT (user_id) DO UPDATE
+                  SET username   = EXCLUDED.username,
+                      first_name = EXCLUDED.first_name
+                RETURNING username, first_name, has_seen_disclaimer, wallet_public_key, balance
+            ),
+            summary AS ({_OPEN_POOL_SUMMARY_SQL})
+            SELECT u.*,
+                   (SELECT COALESCE(json_agg(summary), '[]') FROM summary) AS pools
+              FROM u
+            """,
+            user_id, username, first_name, referred_by,
         )
-        return bool(row["has_seen_disclaimer"]) if row else False
     finally:
         await release_connection(conn)
+    profile = dict(row)
+    pools = _pool_summaries(json.loads(profile.pop("pools")))
+    _profile_cache.put(user_id, profile)
+    return {"profile": profile, "pools": pools}
+
+async def has_seen_disclaimer(user_id: int) -> bool:
+    profile = await get_user_profile(user_id)
+    return bool(profile["has_seen_disclaimer"]) if profile else False
 
 async def set_disclaimer_true(user_id: int) -> None:
     conn = await get_connection()
@@ -131,6 +623,41 @@ async def set_disclaimer_true(user_id: int) -> None:
         )
     finally:
         await release_connection(conn)
+    invalidate_user_profile(user_id)
+
+async def accept_disclaimer(user_id: int) -> Dict[str, Optional[str]]:
+    """
+    Sets the disclaimer flag and assigns a reserved wallet in one statement.
+    Same return shape as generate_user_wallet: the private key is only
+    returned when the wallet was created by this call.
+    """
+    conn = await get_connection()
+    try:
+        row = await conn.fetchrow(
+            RESERVE_KEYPAIR_CTE + """
+            UPDATE users u
+               SET has_seen_disclaimer = TRUE,
+                   wallet_public_key   = COALESCE(u.wallet_public_key, r.public_key),
+                   wallet_private_key  = CASE WHEN u.wallet_public_key IS NULL
+                                              THEN r.private_key
+                                              ELSE u.wallet_private_key END
+              FROM (SELECT 1) one
+              LEFT JOIN reserved r ON TRUE
+             WHERE u.user_id = $1
+            RETURNING u.wallet_public_key, u.wallet_private_key,
+                      r.public_key IS NOT NULL AND u.wallet_public_key = r.public_key AS created
+            """,
+            user_id
+        )
+    finally:
+        await release_connection(conn)
+    invalidate_user_profile(user_id)
+    if row and row["created"]:
+        return {"wallet_public_key": row["wallet_public_key"], "wallet_private_key": row["wallet_private_key"]}
+    if row and row["wallet_public_key"]:
+        return {"wallet_public_key": row["wallet_public_key"], "wallet_private_key": None}
+    # Reservoir was empty (or the user row is missing): fall back to inline generation
+    return await generate_user_wallet(user_id)
 
 async def get_balance(user_id: int) -> float:
     conn = await get_connection()
@@ -152,6 +679,7 @@ async def set_balance(user_id: int, new_balance: float) -> None:
         )
     finally:
         await release_connection(conn)
+    invalidate_user_profile(user_id)
 
 async def increment_user_wins(user_id: int) -> None:
     conn = await get_connection()
@@ -167,6 +695,27 @@ async def increment_user_wins(user_id: int) -> None:
 #     GROUP SETTINGS HELPERS
 # ============================
 
+# chat_ids with buy signals enabled; loaded at startup, kept in sync in place
+# and across processes via NOTIFY signal_groups (see signals.run_signal_listener)
+_signal_groups = set()
+
+async def load_buy_signal_groups() -> None:
+    conn = await get_connection()
+    try:
+        rows = await conn.fetch(
+            "SELECT chat_id FROM group_settings WHERE buy_signals_enabled=TRUE"
+        )
+    finally:
+        await release_connection(conn)
+    _signal_groups.clear()
+    _signal_groups.update(r["chat_id"] for r in rows)
+
+def get_buy_signal_groups() -> List[int]:
+    """
+    Snapshot of the broadcast targets; safe to iterate while groups get pruned.
+    """
+    return list(_signal_groups)
+
 async def set_buy_signals(chat_id: int, enabled: bool) -> None:
     conn = await get_connection()
     try:
@@ -178,8 +727,22 @@ async def set_buy_signals(chat_id: int, enabled: bool) -> None:
             """,
             chat_id, enabled,
         )
+        await conn.execute("SELECT pg_notify('signal_groups', $1)", f"{chat_id} {int(enabled)}")
     finally:
         await release_connection(conn)
+    apply_buy_signals_change(chat_id, enabled)
+
+def apply_buy_signals_change(chat_id: int, enabled: bool) -> None:
+    if enabled:
+        _signal_groups.add(chat_id)
+    else:
+        _signal_groups.discard(chat_id)
+
+async def prune_buy_signal_group(chat_id: int) -> None:
+    """
+    Stops broadcasting to a group the bot can no longer post in.
+    """
+    await set_buy_signals(chat_id, False)
 
 async def get_buy_signals_enabled(chat_id: int) -> bool:
     conn = await get_connection()
@@ -197,14 +760,23 @@ async def get_buy_signals_enabled(chat_id: int) -> bool:
 # ============================
 
 async def generate_user_wallet(user_id: int) -> Dict[str, Optional[str]]:
+    profile = await get_user_profile(user_id)
+    if profile and profile["wallet_public_key"]:
+        return {"wallet_public_key": profile["wallet_public_key"], "wallet_private_key": None}
     conn = await get_connection()
     try:
+        assigned = await assign_reserved_wallet(conn, user_id)
+        if assigned:
+            return assigned
         row = await conn.fetchrow(
             "SELECT wallet_public_key FROM users WHERE user_id=$1",
             user_id
         )
         if row and row["wallet_public_key"]:
             return {"wallet_public_key": row["wallet_public_key"], "wallet_private_key": None}
+        # Reservoir ran dry: generate inline and get it refilled
+        request_refill()
+        from solders.keypair import Keypair
         keypair = Keypair()
         pub = str(keypair.pubkey())
         priv = base58.b58encode(bytes(keypair)).decode()
@@ -215,86 +787,171 @@ async def generate_user_wallet(user_id: int) -> Dict[str, Optional[str]]:
         return {"wallet_public_key": pub, "wallet_private_key": priv}
     finally:
         await release_connection(conn)
+        invalidate_user_profile(user_id)
 
 # ============================
 #       BALANCE SYNC
 # ============================
 
 async def sync_user_wallet_balance(user_id: int) -> float:
+    """
+    Reads the on-chain balance and stores it in users.balance.
+    The write is skipped when the balance has not changed since the last sync.
+    Runs at most once per update (see update_scope.py).
+    """
+    return await memoized(("balance", user_id), _sync_user_wallet_balance, user_id)
+
+async def _sync_user_wallet_balance(user_id: int) -> float:
     from solana_utils import get_wallet_balance
-    conn = await get_connection()
+    profile = await get_user_profile(user_id)
+    if not profile or not profile["wallet_public_key"]:
+        return 0.0
+    onchain = await get_wallet_balance(profile["wallet_public_key"])
+    if onchain != profile["balance"]:
+        conn = await get_connection()
+        try:
+            await conn.execute(
+                "UPDATE users SET balance=$1 WHERE user_id=$2",
+                onchain, user_id
+            )
+        finally:
+            await release_connection(conn)
+        profile["balance"] = onchain
+    return onchain
+
+# ============================
+#       OPEN POOL SUMMARY
+# ============================
+
+def _pool_summaries(rows) -> Dict[str, Dict]:
+    return {
+        r["level"]: {"pool_id": r["pool_id"], "count": r["count"], "pot": float(r["pot"])}
+        for r in rows
+    }
+
+async def get_open_pool_summaries(readonly: bool = False) -> Dict[str, Dict]:
+    """
+    {level: {"pool_id", "count", "pot"}} for the open pool of every level,
+    in a single query regardless of the number of levels.
+    Levels without an open pool are absent. Reads the primary, since menus
+    show it right after a purchase; pass readonly=True only for views that
+    tolerate replica lag.
+    """
+    conn = await get_connection(readonly=readonly)
     try:
-        row = await conn.fetchrow(
-            "SELECT wallet_public_key FROM users WHERE user_id=$1",
-            user_id
-        )
-        if not row or not row["wallet_public_key"]:
-            return 0.0
-        onchain = await get_wallet_balance(row["wallet_public_key"])
-        await conn.execute(
-            "UPDATE users SET balance=$1 WHERE user_id=$2",
-            onchain, user_id
-        )
-        return onchain
+        rows = await conn.fetch(_OPEN_POOL_SUMMARY_SQL)
     finally:
         await release_connection(conn)
+    return _pool_summaries(rows)
 
 # ============================
 #       STATS & HISTORY
 # ============================
 
-async def get_user_stats(user_id: int) -> Dict[str, float]:
-    conn = await get_connection()
+async def get_user_level_stats(user_id: int) -> List[Dict]:
+    """
+    Per-level ticket totals: settled tickets come from user_ticket_stats,
+    tickets in still-open pools are counted live (hot partitions only).
+    """
+    conn = await get_connection(readonly=True)
     try:
-        row = await conn.fetchrow(
+        records = await conn.fetch(
             """
-            SELECT 
-            COUNT(*)::INT                                  AS total_tickets,
-            COALESCE(SUM(value), 0)                       AS total_spent,
-            COALESCE(SUM(prize_amount), 0)                AS total_won,
-            SUM(CASE WHEN status='won' THEN 1 ELSE 0 END)::INT AS total_wins
-            FROM tickets WHERE user_id=$1 AND is_confirmed = TRUE
+            WITH live AS (
+                SELECT level,
+                       COUNT(*)::INT                  AS tickets,
+                       COALESCE(SUM(value), 0)        AS spent,
+                       COALESCE(SUM(prize_amount), 0) AS won,
+                       COUNT(*) FILTER (WHERE status='won')::INT AS wins
+                  FROM tickets
+                 WHERE user_id = $1 AND is_confirmed = TRUE
+                   AND pool_id = ANY(ARRAY(SELECT pool_id FROM pools WHERE status='OPEN'))
+                 GROUP BY level
+            )
+            SELECT level,
+                   SUM(tickets)::INT AS tickets,
+                   SUM(spent)        AS spent,
+                   SUM(won)          AS won,
+                   SUM(wins)::INT    AS wins
+              FROM (
+                    SELECT level, tickets, spent, won, wins FROM live
+                    UNION ALL
+                    SELECT level, tickets, spent, won, wins
+                      FROM user_ticket_stats WHERE user_id = $1
+                   ) s
+             GROUP BY level
             """,
             user_id
         )
-        total_tickets = row["total_tickets"] or 0
-        win_rate = (row["total_wins"] / total_tickets * 100.0) if total_tickets else 0.0
-        return {
-            "total_tickets": total_tickets,
-            "total_spent": float(row["total_spent"]),
-            "total_won": float(row["total_won"]),
-            "total_wins": row["total_wins"],
-            "win_rate": win_rate,
-        }
+        return [dict(rec) for rec in records]
     finally:
         await release_connection(conn)
 
+async def get_user_stats(user_id: int) -> Dict[str, float]:
+    per_level = await get_user_level_stats(user_id)
+    total_tickets = sum(r["tickets"] for r in per_level)
+    total_wins = sum(r["wins"] for r in per_level)
+    win_rate = (total_wins / total_tickets * 100.0) if total_tickets else 0.0
+    return {
+        "total_tickets": total_tickets,
+        "total_spent": float(sum(r["spent"] for r in per_level)),
+        "total_won": float(sum(r["won"] for r in per_level)),
+        "total_wins": total_wins,
+        "win_rate": win_rate,
+    }
+
 async def get_user_history(user_id: int, limit: int = 5) -> List[Dict]:
-    conn = await get_connection()
+    """
+    Most recent tickets first. Reads the hot partitions and only falls
+    back to tickets_archive when they hold fewer than `limit` rows.
+    """
+    query = """
+        SELECT ticket_id, pool_id, level, status, prize_amount, created_at
+        FROM {table}
+        WHERE user_id=$1 AND is_confirmed = TRUE
+        ORDER BY created_at DESC
+        LIMIT $2
+    """
+    conn = await get_connection(readonly=True)
     try:
-        records = await conn.fetch(
-            """
-            SELECT ticket_id, pool_id, level, status, prize_amount, created_at
-            FROM tickets
-            WHERE user_id=$1 AND is_confirmed = TRUE
-            ORDER BY created_at DESC
-            LIMIT $2
-            """,
-            user_id, limit
-        )
+        records = await conn.fetch(query.format(table="tickets"), user_id, limit)
+        if len(records) < limit:
+            records += await conn.fetch(
+                query.format(table="tickets_archive"), user_id, limit - len(records)
+            )
         return [dict(rec) for rec in records]
     finally:
         await release_connection(conn)
 
+# ============================
+#           LEDGER
+# ============================
+
+async def record_ledger_entries(conn, entries: List[tuple]) -> None:
+    """
+    Appends (user_id, kind, amount, pool_id, recipient, signature) rows to
+    ledger_entries in one statement; ledger_totals follows via trigger.
+    Call on the connection and inside the transaction making the change.
+    """
+    if not entries:
+        return
+    await conn.execute(
+        """
+        INSERT INTO ledger_entries (user_id, kind, amount, pool_id, recipient, signature)
+        SELECT * FROM unnest($1::bigint[], $2::text[], $3::float8[], $4::int[], $5::text[], $6::text[])
+        """,
+        *(list(column) for column in zip(*entries))
+    )
+
 # ============================
 #       REFERRAL HELPERS
 # ============================
 
 async def get_referral_stats(user_id: int) -> Dict[str, float]:
-    conn = await get_connection()
+    conn = await get_connection(readonly=True)
     try:
         earnings = await conn.fetchval(
-            "SELECT COALESCE(referral_earnings,0) FROM users WHERE user_id=$1",
+            "SELECT referral FROM ledger_totals WHERE user_id=$1",
             user_id
         )
         count = await conn.fetchval(
@@ -0,0 +1,113 @@
+# export.py
+"""
+Streams accounting data out of the database without touching the bot.
+
+    python export.py tickets --since 2026-01-01 --until 2026-02-01 --out tickets.csv
+    python export.py payouts --format parquet --out payouts.parquet
+    python export.py ledger --since 2026-01-01 --out ledger.csv
+
+Runs in its own process on its own connection (the read replica when
+REPLICA_DATABASE_URL is set). CSV is produced by COPY TO STDOUT straight
+into the file; Parquet is written one row group per --chunk-rows rows.
+Memory use is constant in both cases.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+
+import asyncpg
+
+from config import DATABASE_URL, REPLICA_DATABASE_URL
+
+# $1 / $2: optional lower (inclusive) / upper (exclusive) timestamp bounds
+_DATE_FILTER = "($1::timestamp IS NULL OR {col} >= $1) AND ($2::timestamp IS NULL OR {col} < $2)"
+
+_TICKET_COLUMNS = "ticket_id, pool_id, user_id, level, value, status, prize_amount, is_confirmed, created_at"
+
+QUERIES = {
+    "tickets": f"""
+        SELECT {_TICKET_COLUMNS} FROM tickets
+         WHERE {_DATE_FILTER.format(col="created_at")}
+        UNION ALL
+        SELECT {_TICKET_COLUMNS} FROM tickets_archive
+         WHERE {_DATE_FILTER.format(col="created_at")}
+    """,
+    "pools": f"""
+        SELECT pool_id, level, status, created_at, completed_at, total_pot,
+               first_winner_user_id, second_winner_user_id, third_winner_user_id
+          FROM pools
+         WHERE {_DATE_FILTER.format(col="created_at")}
+         ORDER BY pool_id
+    """,
+    "payouts": f"""
+        SELECT pool_id, level, completed_at, total_pot,
+               first_winner_user_id, second_winner_user_id, third_winner_user_id,
+               regexp_replace(house_fee_tx, '^batch:', '') AS batch_signature
+          FROM pools
+         WHERE status = 'CLOSED'
+           AND {_DATE_FILTER.format(col="completed_at")}
+         ORDER BY pool_id
+    """,
+    "ledger": f"""
+        SELECT id, created_at, user_id, kind, amount, pool_id, recipient, signature
+          FROM ledger_entries
+         WHERE {_DATE_FILTER.format(col="created_at")}
+         ORDER BY id
+    """,
+}
+
+def _parse_date(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+async def _export_csv(conn, query: str, args: tuple, out: str) -> None:
+    await conn.copy_from_query(query, *args, output=out, format="csv", header=True)
+
+def _arrow_type(pa, pg_type: str):
+    return {
+        "int2": pa.int16(), "int4": pa.int32(), "int8": pa.int64(),
+        "float4": pa.float32(), "float8": pa.float64(), "numeric": pa.float64(),
+        "bool": pa.bool_(), "timestamp": pa.timestamp("us"),
+        "timestamptz": pa.timestamp("us", tz="UTC"),
+    }.get(pg_type, pa.string())
+
+async def _export_parquet(conn, query: str, args: tuple, out: str, chunk_rows: int) -> None:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        sys.exit("Parquet export needs pyarrow: pip install pyarrow")
+
+    stmt = await conn.prepare(query)
+    schema = pa.schema([(a.name, _arrow_type(pa, a.type.name)) for a in stmt.get_attributes()])
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        async with conn.transaction():
+            cursor = await stmt.cursor(*args)
+            while True:
+                rows = await cursor.fetch(chunk_rows)
+                if not rows:
+                    break
+                writer.write_table(pa.Table.from_pylist([dict(r) for r in rows], schema=schema))
+
+async def export(dataset: str, fmt: str, out: str, since=None, until=None, chunk_rows: int = 50_000) -> None:
+    conn = await asyncpg.connect(REPLICA_DATABASE_URL or DATABASE_URL)
+    try:
+        query, args = QUERIES[dataset], (since, until)
+        if fmt == "csv":
+            await _export_csv(conn, query, args, out)
+        else:
+            await _export_parquet(conn, query, args, out, chunk_rows)
+    finally:
+        await conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", choices=sorted(QUERIES))
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--since", type=_parse_date, help="inclusive, ISO date/time")
+    parser.add_argument("--until", type=_parse_date, help="exclusive, ISO date/time")
+    parser.add_argument("--chunk-rows", type=int, default=50_000)
+    args = parser.parse_args()
+    asyncio.run(export(args.dataset, args.format, args.out, args.since, args.until, args.chunk_rows))
+    print(f"[export] {args.dataset} written to {args.out}")
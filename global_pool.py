@@ -1,16 +1,65 @@
 # global_pool.py
+import asyncio
+import logging
+import time
+
 import asyncpg
-from config import DATABASE_URL
+from config import DATABASE_URL, REPLICA_DATABASE_URL
+from metrics import DB_ACQUIRE_SECONDS, instrument_connection, timer
 
 pool = None
+replica_pool = None
+
+# Seconds to keep routing reads to the primary after the replica failed
+_REPLICA_RETRY_AFTER = 30.0
+_replica_down_until = 0.0
+
+# Which pool each checked-out connection came from, so release goes back to it
+_owners = {}
 
 async def init_db_pool():
     global pool
-    pool = await asyncpg.create_pool(DATABASE_URL, min_size=2, max_size=10)
+    pool = await asyncpg.create_pool(DATABASE_URL, min_size=2, max_size=10, init=instrument_connection)
     print("[init_db_pool] Connection pool initialized.")
+    await init_replica_pool()
+
+async def init_replica_pool():
+    """
+    Creates the optional read-replica pool from REPLICA_DATABASE_URL.
+    A replica that cannot be reached at startup is simply not used;
+    read-only queries then run on the primary.
+    """
+    global replica_pool
+    if not REPLICA_DATABASE_URL:
+        return
+    try:
+        replica_pool = await asyncpg.create_pool(REPLICA_DATABASE_URL, min_size=1, max_size=10, init=instrument_connection)
+        print("[init_db_pool] Replica connection pool initialized.")
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+        logging.warning("replica pool unavailable, reads go to primary: %s", e)
+        replica_pool = None
 
-async def get_connection():
-    return await pool.acquire()
+async def get_connection(readonly: bool = False):
+    """
+    Acquire a connection. Pass readonly=True for queries that never write;
+    they are routed to the replica when one is configured and reachable,
+    and fall back to the primary otherwise.
+    """
+    global _replica_down_until
+    if readonly and replica_pool is not None and time.monotonic() >= _replica_down_until:
+        try:
+            with timer(DB_ACQUIRE_SECONDS, pool="replica"):
+                conn = await replica_pool.acquire(timeout=5)
+            _owners[conn] = replica_pool
+            return conn
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError,
+                asyncpg.InterfaceError) as e:
+            logging.warning("replica acquire failed, falling back to primary: %s", e)
+            _replica_down_until = time.monotonic() + _REPLICA_RETRY_AFTER
+    with timer(DB_ACQUIRE_SECONDS, pool="primary"):
+        conn = await pool.acquire()
+    _owners[conn] = pool
+    return conn
 
 async def release_connection(conn):
-    await pool.release(conn)
+    await _owners.pop(conn, pool).release(conn)
@@ -0,0 +1,132 @@
+# keypair_pool.py
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import base58
+
+from global_pool import get_connection, release_connection
+
+# Refill when fewer than RESERVOIR_LOW_WATER keypairs are left, up to RESERVOIR_TARGET
+RESERVOIR_LOW_WATER = 200
+RESERVOIR_TARGET = 1000
+# Keypairs generated per worker process call
+REFILL_CHUNK = 250
+# Seconds between reservoir checks
+REFILL_INTERVAL = 5.0
+
+# CTE `reserved`: takes one keypair out of the reservoir, but only if user $1
+# still has no wallet. Callers append the UPDATE that assigns it.
+RESERVE_KEYPAIR_CTE = """
+        WITH reserved AS (
+            DELETE FROM wallet_reservoir
+             WHERE id = (SELECT id FROM wallet_reservoir
+                          ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED)
+               AND EXISTS (SELECT 1 FROM users
+                            WHERE user_id = $1 AND wallet_public_key IS NULL)
+            RETURNING public_key, private_key
+        )
+"""
+
+_executor = None
+_refill_wakeup = asyncio.Event()
+
+def _generate_keypairs(n: int) -> List[Tuple[str, str]]:
+    """
+    Runs in a worker process: returns n (public_key, base58 private_key) pairs.
+    """
+    from solders.keypair import Keypair
+    pairs = []
+    for _ in range(n):
+        kp = Keypair()
+        pairs.append((str(kp.pubkey()), base58.b58encode(bytes(kp)).decode()))
+    return pairs
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, not fork: this process already runs threads (ticket
+        # rendering, asyncio.to_thread), and a forked child can inherit
+        # one of their locks held and deadlock
+        _executor = ProcessPoolExecutor(
+            max_workers=max(1, (os.cpu_count() or 2) - 1),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+async def reservoir_size() -> int:
+    conn = await get_connection()
+    try:
+        return await conn.fetchval("SELECT COUNT(*) FROM wallet_reservoir")
+    finally:
+        await release_connection(conn)
+
+async def refill_reservoir(target: int = RESERVOIR_TARGET) -> int:
+    """
+    Tops the reservoir up to `target` keypairs, generating them in parallel
+    worker processes and inserting them with a single COPY.
+    Returns the number of keypairs added.
+    """
+    missing = target - await reservoir_size()
+    if missing <= 0:
+        return 0
+    loop = asyncio.get_running_loop()
+    chunks = [min(REFILL_CHUNK, missing - i) for i in range(0, missing, REFILL_CHUNK)]
+    results = await asyncio.gather(*(
+        loop.run_in_executor(_get_executor(), _generate_keypairs, n) for n in chunks
+    ))
+    records = [pair for chunk in results for pair in chunk]
+    conn = await get_connection()
+    try:
+        await conn.copy_records_to_table(
+            "wallet_reservoir",
+            records=records,
+            columns=["public_key", "private_key"],
+        )
+    finally:
+        await release_connection(conn)
+    return len(records)
+
+async def assign_reserved_wallet(conn, user_id: int) -> Optional[Dict[str, str]]:
+    """
+    Atomically moves one pre-generated keypair from the reservoir onto a
+    user that has no wallet yet. Returns None when the user already has a
+    wallet or the reservoir is empty.
+    """
+    row = await conn.fetchrow(
+        RESERVE_KEYPAIR_CTE + """
+        UPDATE users u
+           SET wallet_public_key  = r.public_key,
+               wallet_private_key = r.private_key
+          FROM reserved r
+         WHERE u.user_id = $1 AND u.wallet_public_key IS NULL
+        RETURNING u.wallet_public_key, u.wallet_private_key
+        """,
+        user_id
+    )
+    if not row:
+        return None
+    return {"wallet_public_key": row["wallet_public_key"], "wallet_private_key": row["wallet_private_key"]}
+
+def request_refill() -> None:
+    """
+    Wakes the refiller early, e.g. after onboarding found the reservoir empty.
+    """
+    _refill_wakeup.set()
+
+async def run_keypair_refiller(interval: float = REFILL_INTERVAL) -> None:
+    while True:
+        try:
+            if await reservoir_size() < RESERVOIR_LOW_WATER:
+                added = await refill_reservoir()
+                print(f"[keypair_pool] Added {added} keypairs to the reservoir.")
+        except Exception as e:
+            logging.error("keypair reservoir refill failed: %s", e)
+        _refill_wakeup.clear()
+        try:
+            await asyncio.wait_for(_refill_wakeup.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
@@ -1,12 +1,17 @@
 ﻿import random
 import asyncio
+import logging
 import time
 from collections import defaultdict
+from typing import Awaitable, Callable, Optional
 
 from aiogram import Bot
 from aiogram.types import CallbackQuery, FSInputFile
 
 from global_pool import get_connection, release_connection
+from database import open_new_pool, record_ledger_entries, rollup_pool_stats
+from metrics import DRAW_SECONDS, timed
+from tracing import phase
 from config import (
     DEV_WALLET,
     HOUSE_WALLET,
@@ -17,7 +22,7 @@ from config import (
     _LEVEL_EMOJIS,
     _LEVEL_NAMES,
 )
-from solana_utils import get_wallet_balance, pay_sol, batch_pay_sol
+from signals import broadcast_photo
 from keyboards import (
     play_menu_keyboard,
     play_again_keyboard,
@@ -34,17 +39,34 @@ async def buy_ticket(
     level: str,
     cbq: CallbackQuery,
     bot: Bot,
-    num_tickets: int = 1
+    num_tickets: int = 1,
+    progress: Optional[Callable[[str], Awaitable]] = None
 ) -> dict:
     """
     Clean version — uses pooled connections, updates ticket status.
+    `progress(stage)` is called as the purchase advances:
+    "reserving" (locking a spot), "sending" (on-chain transfer) and
+    "confirmed" (transfer confirmed, tickets committed). "sending" happens
+    while the pool row is locked, so it runs as a task rather than making
+    other buyers wait on Telegram.
     """
+    from solana_utils import get_wallet_balance, pay_sol
     key = f"{user_id}_{level}"
     now = time.time()
     if now - last_buy_time[key] < BUY_COOLDOWN:
         return {"success": False, "message": f"⏱️ Please wait {BUY_COOLDOWN}s before buying again."}
     last_buy_time[key] = now
 
+    async def report(stage: str):
+        if progress is None:
+            return
+        try:
+            await progress(stage)
+        except Exception as e:
+            logging.warning("purchase progress update failed: %s", e)
+
+    await report("reserving")
+    sending_notice = None
     conn = await get_connection()
     try:
         async with conn.transaction():
@@ -78,7 +100,8 @@ async def buy_ticket(
             if onchain < total_cost:
                 return {"success": False, "message": f"💸 Insufficient funds: {onchain:.4f} vs {total_cost:.4f}"}
 
-            # 5) Transfer funds
+            # 5) Transfer funds (progress edit off the lock)
+            sending_notice = asyncio.create_task(report("sending"))
             try:
                 tx_sig = await pay_sol(priv, pub, POOL_PUBLIC_KEY, total_cost)
             except Exception as e:
@@ -90,6 +113,13 @@ async def buy_ticket(
                     "INSERT INTO tickets (pool_id, user_id, level, value, status) VALUES ($1,$2,$3,$4,'not_drawn')",
                     pool_id, user_id, level, ticket_price
                 )
+            await record_ledger_entries(conn, [
+                (user_id, "ticket_purchase", -total_cost, pool_id, POOL_PUBLIC_KEY, tx_sig)
+            ])
+
+        # keep the edits in order
+        await sending_notice
+        await report("confirmed")
 
         # After transaction:
         final_count = await conn.fetchval("SELECT COUNT(*) FROM tickets WHERE pool_id=$1", pool_id)
@@ -112,11 +142,17 @@ async def buy_ticket(
         return {"success": False, "message": f"🚫 Purchase failed: {e}"}
     finally:
         await release_connection(conn)
+        # a failed purchase must not be followed by a late "sending" edit
+        if sending_notice is not None:
+            await sending_notice
 
+@timed(DRAW_SECONDS)
 async def run_lottery(bot: Bot, pool_id: int):
     from collections import defaultdict
     from aiogram.types import FSInputFile
+    from solana_utils import batch_pay_sol
 
+    phase("draw.pick", pool_id=pool_id)
     conn = await get_connection()
     try:
         async with conn.transaction():
@@ -151,10 +187,11 @@ async def run_lottery(bot: Bot, pool_id: int):
             dev_fee      = pot * 0.02
 
             # e) Mark winners in tickets table
+            phase("draw.settle", tickets=len(tickets))
             async def mark_winner(ticket, prize):
                 await conn.execute(
-                    "UPDATE tickets SET status='won', prize_amount=$1 WHERE ticket_id=$2",
-                    prize, ticket["ticket_id"]
+                    "UPDATE tickets SET status='won', prize_amount=$1 WHERE ticket_id=$2 AND pool_id=$3",
+                    prize, ticket["ticket_id"], pool_id
                 )
             await mark_winner(first, first_prize)
             if second: await mark_winner(second, second_prize)
@@ -173,8 +210,12 @@ async def run_lottery(bot: Bot, pool_id: int):
                 ids_won
             )
 
-            # g) Build list of transfers (winners + fees)
+            # f2) Fold this pool into the per-user ticket aggregates
+            await rollup_pool_stats(conn, pool_id)
+
+            # g) Build list of transfers (winners + fees), with their ledger entries
             transfers = []
+            ledger = []
             for ticket, amount in ((first, first_prize), (second, second_prize), (third, third_prize)):
                 if ticket and amount > 0:
                     pub = await conn.fetchval(
@@ -183,9 +224,12 @@ async def run_lottery(bot: Bot, pool_id: int):
                     )
                     if pub:
                         transfers.append({"recipient": pub, "amount_sol": amount})
+                        ledger.append((ticket["user_id"], "prize", amount, pool_id, pub))
 
             transfers.append({"recipient": HOUSE_WALLET, "amount_sol": house_fee})
             transfers.append({"recipient": DEV_WALLET,   "amount_sol": dev_fee})
+            ledger.append((None, "house_fee", house_fee, pool_id, HOUSE_WALLET))
+            ledger.append((None, "dev_fee", dev_fee, pool_id, DEV_WALLET))
 
             # h) Compute and add referral bonuses (3%)
             REF_PCT = 0.03
@@ -210,13 +254,16 @@ async def run_lottery(bot: Bot, pool_id: int):
                     )
                     if pub_ref:
                         transfers.append({"recipient": pub_ref, "amount_sol": amt})
+                        ledger.append((ref_id, "referral_bonus", amt, pool_id, pub_ref))
                         await conn.execute(
                             "UPDATE users SET referral_earnings = referral_earnings + $1 WHERE user_id=$2",
                             amt, ref_id
                         )
 
             # i) Execute batch transaction on-chain
+            phase("draw.payout", transfers=len(transfers))
             batch_sig = await batch_pay_sol(POOL_PRIVATE_KEY, POOL_PUBLIC_KEY, transfers)
+            await record_ledger_entries(conn, [entry + (batch_sig,) for entry in ledger])
 
             # j) Close the pool with metadata
             await conn.execute(
@@ -243,6 +290,7 @@ async def run_lottery(bot: Bot, pool_id: int):
         # ─── end transaction block ───
 
         # 1) Notify winners privately
+        phase("draw.notify")
         photo = FSInputFile("WinnerLucky.jpg")
         for ticket, medal, prize in [
             (first,  "🏆", first_prize),
@@ -310,31 +358,19 @@ async def run_lottery(bot: Bot, pool_id: int):
         await release_connection(conn)
 
     # 5) Send to extra groups
-    extra_conn = await get_connection()
-    try:
-        rows = await extra_conn.fetch(
-            "SELECT chat_id FROM group_settings WHERE buy_signals_enabled = TRUE"
-        )
-        for r in rows:
-            try:
-                await bot.send_photo(
-                    chat_id      = r["chat_id"],
-                    photo        = photo,
-                    caption      = announcement,
-                    parse_mode   = "HTML",
-                    reply_markup = group_buy_signal_keyboard()
-                )
-            except Exception as ge:
-                print(f"[run_lottery] extra group error ({r['chat_id']}): {ge}")
-    finally:
-        await release_connection(extra_conn)
+    phase("draw.broadcast")
+    await broadcast_photo(
+        bot,
+        photo,
+        announcement,
+        parse_mode   = "HTML",
+        reply_markup = group_buy_signal_keyboard()
+    )
 
     # 6) Re-open a new pool at this level
+    phase("draw.reopen")
     new_conn = await get_connection()
     try:
-        await new_conn.execute(
-            "INSERT INTO pools (level, status) VALUES ($1, 'OPEN')",
-            level
-        )
+        await open_new_pool(new_conn, level)
     finally:
         await release_connection(new_conn)
@@ -2,38 +2,116 @@
 # -*- coding: utf-8 -*-
 import asyncio
 import sys
+import time
 
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import BOT_TOKEN
+from config import BOT_TOKEN, BOT_MODE, METRICS_PORT, RECORD_UPDATES
 from global_pool import init_db_pool
-from database import init_db
-from bot import router
+from database import init_db, load_buy_signal_groups
+from archival import run_archival_job
+from keypair_pool import run_keypair_refiller
+from pool_state import run_pool_state_listener
+from signals import run_buy_signal_digests, run_signal_listener
+from pg_storage import PostgresStorage
+from metrics import HandlerTimingMiddleware, start_metrics_server
+from update_scope import UpdateScopeMiddleware
+from withdrawals import run_withdrawal_worker, run_confirmation_poller
+from tracing import TelegramSpanMiddleware, UpdateSpanMiddleware, init_tracing, run_trace_exporter
 
 # Op Windows gebruik je de SelectorEventLoopPolicy
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-async def main():
+_background_tasks = []
+
+def _warm_ticket_renderer():
+    from ticket_image import init_ticket_renderer
+    init_ticket_renderer()
+
+async def setup_bot(worker: int = 0) -> tuple:
+    """
+    Everything a process needs before it can handle updates: DB pool,
+    schema, caches and the dispatcher. Returns (bot, dp, timings).
+    Only worker 0 runs the maintenance jobs (archival, keypair refill,
+    withdrawals).
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    tracing = init_tracing(worker)
+    if tracing:
+        _background_tasks.append(asyncio.create_task(run_trace_exporter()))
+
     # 1) Start de DB-pool
     await init_db_pool()
+    timings["pool"] = time.perf_counter() - t0
     print("[startup] DB connection pool initialized.")
 
-    # 2) Run je migrations / schema-init
-    await init_db()
-    print("[startup] Database schema ready.")
+    # 2) Run je migrations / schema-init (skipped when the version matches)
+    t = time.perf_counter()
+    applied = await init_db()
+    timings["schema"] = time.perf_counter() - t
+    print(f"[startup] Database schema ready ({'applied' if applied else 'up to date'}).")
+
+    t = time.perf_counter()
+    await load_buy_signal_groups()
+    timings["signals"] = time.perf_counter() - t
+    # PIL and the ticket template load off the startup path
+    _background_tasks.append(asyncio.create_task(asyncio.to_thread(_warm_ticket_renderer)))
+
+    if worker == 0:
+        _background_tasks.append(asyncio.create_task(run_archival_job()))
+        _background_tasks.append(asyncio.create_task(run_keypair_refiller()))
+    _background_tasks.append(asyncio.create_task(run_pool_state_listener()))
 
     # 3) Maak Bot & Dispatcher
+    t = time.perf_counter()
+    from bot import router
+    timings["router_import"] = time.perf_counter() - t
     bot = Bot(token=BOT_TOKEN, parse_mode="HTML")
-    dp = Dispatcher(storage=MemoryStorage())
+    if tracing:
+        bot.session.middleware(TelegramSpanMiddleware())
+    storage = PostgresStorage()
+    _background_tasks.append(asyncio.create_task(storage.run_listener()))
+    dp = Dispatcher(storage=storage)
+    # start_polling never closes the storage; flush FSM writes on shutdown
+    dp.shutdown.register(storage.close)
+    # one digest for all workers: the others forward purchases to worker 0
+    _background_tasks.append(asyncio.create_task(run_signal_listener(digest_owner=worker == 0)))
+    if worker == 0:
+        _background_tasks.append(asyncio.create_task(run_buy_signal_digests(bot)))
+        _background_tasks.append(asyncio.create_task(run_withdrawal_worker(bot)))
+        _background_tasks.append(asyncio.create_task(run_confirmation_poller(bot)))
 
     # 4) Voeg al je handlers toe
+    if tracing:
+        dp.update.outer_middleware(UpdateSpanMiddleware())
+    if RECORD_UPDATES:
+        from update_recorder import UpdateRecorderMiddleware, recorder_for_worker
+        recorder = recorder_for_worker(worker)
+        _background_tasks.append(asyncio.create_task(recorder.run()))
+        dp.update.outer_middleware(UpdateRecorderMiddleware(recorder))
+    dp.update.outer_middleware(UpdateScopeMiddleware())
+    dp.message.middleware(HandlerTimingMiddleware())
+    dp.callback_query.middleware(HandlerTimingMiddleware())
     dp.include_router(router)
+    if METRICS_PORT:
+        await start_metrics_server(METRICS_PORT + worker)
+
+    timings["total"] = time.perf_counter() - t0
+    print("[startup] Timings: " + ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items()))
+    return bot, dp, timings
+
+async def main():
+    bot, dp, _ = await setup_bot()
 
     # 5) Start polling
     print("[startup] Bot is polling now...")
     await dp.start_polling(bot, skip_updates=True)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if BOT_MODE == "webhook":
+        from webhook import run_webhook
+        run_webhook()
+    else:
+        asyncio.run(main())
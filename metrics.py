@@ -0,0 +1,170 @@
+# metrics.py
+"""
+In-process latency histograms, exposed in Prometheus text format on
+http://127.0.0.1:METRICS_PORT/metrics.
+
+HandlerTimingMiddleware times every handler and remembers its name in a
+context variable for the duration of the update, so DB queries and RPC
+calls made on its behalf are labelled with it (handler="-" outside of
+handlers, e.g. background jobs). Every timed section and query is also a
+trace span when tracing is on (see tracing.py).
+"""
+import functools
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiohttp import web
+
+from tracing import record_span, span
+
+# Name of the handler the current task is working for
+current_handler: ContextVar[str] = ContextVar("current_handler", default="-")
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_registry = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Histogram:
+    def __init__(self, name: str, description: str, span_name: str, by_handler: bool = False,
+                 buckets: tuple = _BUCKETS):
+        self.name = name
+        self.description = description
+        self.span_name = span_name
+        self.by_handler = by_handler
+        self.buckets = buckets
+        # sorted label items -> per-bucket counts (not cumulative) + [sum, count]
+        self._series: Dict[tuple, list] = {}
+        _registry.append(self)
+
+    def observe(self, seconds: float, **labels) -> None:
+        if self.by_handler:
+            labels["handler"] = current_handler.get()
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+        i = bisect_left(self.buckets, seconds)
+        if i < len(self.buckets):
+            series[i] += 1
+        series[-2] += seconds
+        series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, series in self._series.items():
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+            sep = "," if labels else ""
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {series[-1]}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{suffix} {series[-1]}")
+        return lines
+
+HANDLER_SECONDS = Histogram("luckysol_handler_seconds", "Handler latency", "handler", by_handler=True)
+DB_QUERY_SECONDS = Histogram("luckysol_db_query_seconds", "Postgres query time", "db.query", by_handler=True)
+DB_ACQUIRE_SECONDS = Histogram(
+    "luckysol_db_pool_acquire_seconds", "Wait for a pooled connection", "db.acquire", by_handler=True
+)
+RPC_SECONDS = Histogram("luckysol_rpc_seconds", "Solana RPC call time", "rpc", by_handler=True)
+TICKET_RENDER_SECONDS = Histogram("luckysol_ticket_render_seconds", "Ticket image rendering", "ticket.render")
+GROUP_SEND_SECONDS = Histogram("luckysol_group_send_seconds", "Buy-signal broadcast to all groups", "group.send")
+DRAW_SECONDS = Histogram("luckysol_draw_seconds", "Full lottery draw incl. payouts and announcements", "draw")
+
+@contextmanager
+def timer(histogram: Histogram, **labels):
+    """
+    Observes the block's duration and wraps it in a span named after the
+    histogram and its label values, e.g. "rpc.pay_sol".
+    """
+    t0 = time.perf_counter()
+    try:
+        with span(".".join([histogram.span_name, *map(str, labels.values())]), **labels):
+            yield
+    finally:
+        histogram.observe(time.perf_counter() - t0, **labels)
+
+def timed(histogram: Histogram, **labels):
+    """
+    Decorator for coroutine functions: observes each call's duration.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with timer(histogram, **labels):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ----------------------------
+# AIOGRAM / ASYNCPG HOOKS
+# ----------------------------
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """
+    Register as an inner middleware (dp.message.middleware(...)), where the
+    matched handler is known.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_obj = data.get("handler")
+        name = getattr(getattr(handler_obj, "callback", None), "__name__", "unknown")
+        token = current_handler.set(name)
+        try:
+            with timer(HANDLER_SECONDS, handler=name):
+                return await handler(event, data)
+        finally:
+            current_handler.reset(token)
+
+def _log_query(record) -> None:
+    # called via loop.call_soon from the querying task, so its context applies
+    DB_QUERY_SECONDS.observe(record.elapsed)
+    # the statement only; arguments may hold user data
+    record_span(DB_QUERY_SECONDS.span_name, record.elapsed, record.exception, statement=record.query[:200])
+
+async def instrument_connection(conn) -> None:
+    """
+    asyncpg pool `init` hook: times every query run on the connection.
+    Query loggers need asyncpg >= 0.29; with an older asyncpg the
+    connection is used uninstrumented.
+    """
+    if hasattr(conn, "add_query_logger"):
+        conn.add_query_logger(_log_query)
+
+# ----------------------------
+# HTTP ENDPOINT
+# ----------------------------
+
+def render_metrics() -> str:
+    lines = []
+    for histogram in _registry:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+async def _serve_metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        body=render_metrics().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
+async def start_metrics_server(port: int, host: str = "127.0.0.1") -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/metrics", _serve_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"[metrics] Serving on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,181 @@
+# pg_storage.py
+"""
+aiogram FSM storage kept in Postgres (table fsm_storage), so conversation
+state and per-user preferences survive restarts and are shared by every
+bot instance.
+
+Reads are served from a per-process LRU cache while this instance is
+LISTENing on channel `fsm_storage`; writes land in the cache at once and
+are flushed to the database in batches every FSM_FLUSH_DELAY seconds.
+Each flush notifies the other instances, which drop their cached copy of
+the keys involved.
+"""
+import asyncio
+import copy
+import json
+import logging
+import uuid
+from typing import Any, Dict, Optional
+
+import asyncpg
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+from cache_utils import LRUCache
+from config import DATABASE_URL
+from global_pool import get_connection, release_connection
+
+FSM_CACHE_SIZE = 10_000
+# Writes within this many seconds are coalesced into one round trip
+FSM_FLUSH_DELAY = 0.05
+# Seconds between listener health checks / reconnect attempts
+LISTENER_CHECK_INTERVAL = 5.0
+
+def _storage_key(key: StorageKey) -> str:
+    return ":".join(str(part) for part in (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id or "",
+        getattr(key, "business_connection_id", None) or "", key.destiny,
+    ))
+
+class PostgresStorage(BaseStorage):
+    def __init__(self, cache_size: int = FSM_CACHE_SIZE, flush_delay: float = FSM_FLUSH_DELAY):
+        self._cache = LRUCache(cache_size)
+        self._flush_delay = flush_delay
+        # key -> {"state", "data"} written locally, not yet in the database
+        self._dirty: Dict[str, Dict] = {}
+        self._flushing: Dict[str, Dict] = {}
+        self._flush_task = None
+        # True while the cache is kept coherent by a live LISTEN connection
+        self._live = False
+        self._instance = uuid.uuid4().hex
+
+    # ---------------------------
+    # READ / WRITE
+    # ---------------------------
+
+    async def _load(self, key: str) -> Dict:
+        record = self._dirty.get(key) or self._flushing.get(key)
+        if record is not None:
+            return record
+        if self._live:
+            record = self._cache.get(key)
+            if record is not None:
+                return record
+        conn = await get_connection()
+        try:
+            row = await conn.fetchrow("SELECT state, data FROM fsm_storage WHERE key=$1", key)
+        finally:
+            await release_connection(conn)
+        record = {"state": row["state"], "data": json.loads(row["data"])} if row else {"state": None, "data": {}}
+        if self._live:
+            self._cache.put(key, record)
+        return record
+
+    async def _store(self, key: str, **changes) -> None:
+        record = dict(await self._load(key), **changes)
+        self._dirty[key] = record
+        self._cache.put(key, record)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        await self._store(_storage_key(key), state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(_storage_key(key)))["state"]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._store(_storage_key(key), data=copy.deepcopy(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy.deepcopy((await self._load(_storage_key(key)))["data"])
+
+    # ---------------------------
+    # FLUSHING
+    # ---------------------------
+
+    async def _flush_loop(self) -> None:
+        while self._dirty:
+            await asyncio.sleep(self._flush_delay)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.warning("fsm storage flush failed: %s", e)
+                await asyncio.sleep(LISTENER_CHECK_INTERVAL)
+
+    async def flush(self) -> None:
+        """
+        Writes all pending changes in one transaction. Empty records
+        (no state, no data) are deleted instead of stored.
+        """
+        if not self._dirty:
+            return
+        self._flushing, self._dirty = self._dirty, {}
+        batch = self._flushing
+        keep = {k: r for k, r in batch.items() if r["state"] is not None or r["data"]}
+        drop = [k for k in batch if k not in keep]
+        conn = None
+        try:
+            conn = await get_connection()
+            async with conn.transaction():
+                if keep:
+                    await conn.execute(
+                        """
+                        INSERT INTO fsm_storage (key, state, data)
+                        SELECT k, s, d::jsonb FROM unnest($1::text[], $2::text[], $3::text[]) AS t(k, s, d)
+                        ON CONFLICT (key) DO UPDATE
+                           SET state = EXCLUDED.state, data = EXCLUDED.data, updated_at = NOW()
+                        """,
+                        list(keep), [r["state"] for r in keep.values()],
+                        [json.dumps(r["data"]) for r in keep.values()]
+                    )
+                if drop:
+                    await conn.execute("DELETE FROM fsm_storage WHERE key = ANY($1::text[])", drop)
+                await conn.execute(
+                    "SELECT pg_notify('fsm_storage', $1 || ' ' || k) FROM unnest($2::text[]) AS k",
+                    self._instance, list(batch)
+                )
+        except Exception:
+            # newer local writes win over the failed batch
+            for k, r in batch.items():
+                self._dirty.setdefault(k, r)
+            raise
+        finally:
+            self._flushing = {}
+            if conn is not None:
+                await release_connection(conn)
+
+    async def close(self) -> None:
+        await self.flush()
+
+    # ---------------------------
+    # CACHE INVALIDATION
+    # ---------------------------
+
+    def _on_notify(self, conn, pid, channel, payload) -> None:
+        instance, _, key = payload.partition(" ")
+        if instance != self._instance:
+            self._cache.pop(key)
+
+    async def run_listener(self) -> None:
+        """
+        Holds a dedicated LISTEN fsm_storage connection, reconnecting when
+        it drops. While disconnected every read goes to the database.
+        """
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(DATABASE_URL)
+                await conn.add_listener("fsm_storage", self._on_notify)
+                self._cache.clear()
+                self._live = True
+                print("[pg_storage] Listening for FSM changes.")
+                while not conn.is_closed():
+                    await asyncio.sleep(LISTENER_CHECK_INTERVAL)
+            except Exception as e:
+                logging.warning("fsm_storage listener error: %s", e)
+            finally:
+                self._live = False
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(LISTENER_CHECK_INTERVAL)
@@ -0,0 +1,81 @@
+# pool_state.py
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import asyncpg
+
+from config import DATABASE_URL
+from database import get_open_pool_summaries
+from update_scope import memoized
+
+# Seconds between listener health checks / reconnect attempts
+LISTENER_CHECK_INTERVAL = 5.0
+
+# level -> {"pool_id", "count", "pot"} of its open pool; absent = no open pool
+_snapshot: Dict[str, Dict] = {}
+# True while the snapshot is kept current by a live LISTEN connection
+_live = False
+_dirty = False
+_refresh_task = None
+
+async def _refresh() -> None:
+    global _dirty, _snapshot
+    while _dirty:
+        _dirty = False
+        try:
+            # primary, so the snapshot never lags behind the notification
+            _snapshot = await get_open_pool_summaries(readonly=False)
+        except Exception as e:
+            logging.warning("pool snapshot refresh failed: %s", e)
+
+def _on_notify(conn, pid, channel, payload) -> None:
+    """
+    Coalesces bursts of notifications into one refresh query at a time.
+    """
+    global _dirty, _refresh_task
+    _dirty = True
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.get_running_loop().create_task(_refresh())
+
+async def get_all_pool_snapshots() -> Dict[str, Dict]:
+    """
+    Open-pool summary of every level. Served from memory while the
+    listener is connected; falls back to one query (per update) otherwise,
+    on the primary: menus read it right after the user's own purchase.
+    """
+    if _live:
+        return _snapshot
+    return await memoized("pool_snapshots", get_open_pool_summaries, False)
+
+async def get_pool_snapshot(level: str) -> Optional[Dict]:
+    return (await get_all_pool_snapshots()).get(level)
+
+async def run_pool_state_listener() -> None:
+    """
+    Holds a dedicated LISTEN pool_state connection to the primary,
+    reconnecting when it drops or stops answering. Every bot instance runs
+    one, so all of them see purchases and draws made by any other
+    instance. The snapshot is reloaded on every (re)connect to cover
+    changes missed while disconnected.
+    """
+    global _live, _snapshot
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(DATABASE_URL)
+            await conn.add_listener("pool_state", _on_notify)
+            _snapshot = await get_open_pool_summaries(readonly=False)
+            _live = True
+            print("[pool_state] Listening for pool changes.")
+            while True:
+                await asyncio.sleep(LISTENER_CHECK_INTERVAL)
+                # a half-open connection never reports closed; make it answer
+                await conn.fetchval("SELECT 1", timeout=LISTENER_CHECK_INTERVAL)
+        except Exception as e:
+            logging.warning("pool_state listener error: %s", e)
+        finally:
+            _live = False
+            if conn is not None and not conn.is_closed():
+                conn.terminate()
+        await asyncio.sleep(LISTENER_CHECK_INTERVAL)
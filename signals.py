@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+import asyncpg
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from config import DATABASE_URL, POOL_SIZE, _LEVEL_EMOJIS, _LEVEL_NAMES, _LEVELS
+from database import (
+    apply_buy_signals_change,
+    get_buy_signal_groups,
+    load_buy_signal_groups,
+    prune_buy_signal_group,
+)
+from global_pool import get_connection, release_connection
+from keyboards import group_buy_signal_keyboard
+from metrics import GROUP_SEND_SECONDS, timed
+
+# Purchases are announced to groups at most once per this many seconds
+SIGNAL_DIGEST_INTERVAL = 60.0
+# Seconds between listener keepalive queries / reconnect attempts
+LISTENER_CHECK_INTERVAL = 5.0
+
+# level -> purchases queued since the last announcement
+_pending: Dict[str, Dict] = {}
+_pending_event = asyncio.Event()
+# Only one process (worker 0) runs the digests; the others forward their
+# purchases to it over NOTIFY buy_signals
+_digest_owner = True
+_forwarding = set()
+
+def _is_dead_chat(error: Exception) -> bool:
+    """
+    True for send errors that will never succeed again for this chat:
+    the bot was kicked/blocked, or the chat no longer exists.
+    """
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    return isinstance(error, TelegramBadRequest) and "chat not found" in str(error).lower()
+
+def _is_bad_file_id(error: Exception) -> bool:
+    """
+    True when Telegram rejects a cached file_id ("wrong file identifier",
+    "invalid file_id", ...); uploading the file again will work.
+    """
+    message = str(error).lower()
+    return isinstance(error, TelegramBadRequest) and ("file identifier" in message or "file_id" in message)
+
+async def _send_to_groups(send) -> None:
+    """
+    Calls `send(chat_id)` for every group with buy signals enabled.
+    Groups that are gone for good are pruned.
+    """
+    for chat_id in get_buy_signal_groups():
+        try:
+            await send(chat_id)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            if _is_dead_chat(e):
+                logging.info("pruning buy-signal group %s: %s", chat_id, e)
+                await prune_buy_signal_group(chat_id)
+            else:
+                logging.warning("buy-signal send to %s failed: %s", chat_id, e)
+        except Exception as e:
+            logging.warning("buy-signal send to %s failed: %s", chat_id, e)
+
+@timed(GROUP_SEND_SECONDS, kind="photo")
+async def broadcast_photo(
+    bot: Bot,
+    photo,
+    caption: str,
+    reupload: Optional[Callable[[], Awaitable]] = None,
+    **kwargs
+) -> Optional[str]:
+    """
+    Sends `photo` to every group with buy signals enabled.
+    The file is uploaded at most once: after the first successful send the
+    returned file_id is reused for the remaining groups and returned, so
+    callers can cache it. When Telegram rejects a cached file_id, the file
+    returned by `reupload()` is sent instead.
+    """
+    file_id = photo if isinstance(photo, str) else None
+
+    async def send(chat_id):
+        nonlocal file_id, photo
+        try:
+            sent = await bot.send_photo(chat_id=chat_id, photo=file_id or photo, caption=caption, **kwargs)
+        except TelegramBadRequest as e:
+            if file_id is None or reupload is None or not _is_bad_file_id(e):
+                raise
+            logging.warning("cached photo file_id rejected, uploading again: %s", e)
+            file_id, photo = None, await reupload()
+            sent = await bot.send_photo(chat_id=chat_id, photo=photo, caption=caption, **kwargs)
+        if file_id is None and sent.photo:
+            file_id = sent.photo[-1].file_id
+
+    await _send_to_groups(send)
+    return file_id
+
+@timed(GROUP_SEND_SECONDS, kind="text")
+async def broadcast_message(bot: Bot, text: str, **kwargs) -> None:
+    async def send(chat_id):
+        await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+
+    await _send_to_groups(send)
+
+# ============================
+#     COALESCED BUY SIGNALS
+# ============================
+
+def queue_buy_signal(
+    level: str,
+    buyer_name: str,
+    tickets: int,
+    pool_id: int,
+    spots_left: int,
+    pot: float
+) -> None:
+    """
+    Records a purchase for the next group announcement. Pool figures are
+    overwritten by later purchases, so announcements show the latest state.
+    In a process that does not run the digests the purchase is forwarded
+    to the one that does.
+    """
+    if not _digest_owner:
+        payload = json.dumps([level, buyer_name, tickets, pool_id, spots_left, pot])
+        task = asyncio.get_running_loop().create_task(_forward_buy_signal(payload))
+        _forwarding.add(task)
+        task.add_done_callback(_forwarding.discard)
+        return
+    _queue_locally(level, buyer_name, tickets, pool_id, spots_left, pot)
+
+async def _forward_buy_signal(payload: str) -> None:
+    conn = await get_connection()
+    try:
+        await conn.execute("SELECT pg_notify('buy_signals', $1)", payload)
+    except Exception as e:
+        logging.warning("buy-signal forward failed: %s", e)
+    finally:
+        await release_connection(conn)
+
+def _queue_locally(
+    level: str,
+    buyer_name: str,
+    tickets: int,
+    pool_id: int,
+    spots_left: int,
+    pot: float
+) -> None:
+    entry = _pending.setdefault(level, {"purchases": 0, "tickets": 0, "buyers": set()})
+    entry["purchases"] += 1
+    entry["tickets"] += tickets
+    entry["buyers"].add(buyer_name)
+    entry.update(buyer=buyer_name, pool_id=pool_id, spots_left=spots_left, pot=pot)
+    _pending_event.set()
+
+def _period_label(seconds: float) -> str:
+    return "minute" if seconds == 60 else f"{seconds:.0f} seconds"
+
+async def flush_buy_signals(bot: Bot, period: float = SIGNAL_DIGEST_INTERVAL) -> None:
+    """
+    Announces everything queued so far with one call per group: the ticket
+    picture for a lone purchase, a text digest for anything more.
+    """
+    pending = dict(_pending)
+    _pending.clear()
+    _pending_event.clear()
+    if not pending:
+        return
+
+    if len(pending) == 1 and next(iter(pending.values()))["purchases"] == 1:
+        level, d = next(iter(pending.items()))
+        plural = "ticket" if d["tickets"] == 1 else "tickets"
+        announcement = (
+            f"{d['buyer']} just bought {d['tickets']} {plural} in pool "
+            f"{_LEVEL_EMOJIS[level]} {_LEVEL_NAMES[level]} (#{d['pool_id']})! "
+            f"Spots left: {d['spots_left']}/{POOL_SIZE} | Current pot: {d['pot']:.2f} SOL"
+        )
+        from ticket_image import forget_ticket_file_id, get_ticket_photo, remember_ticket_file_id
+        ticket_key, photo = await get_ticket_photo(d["buyer"], d["pot"])
+
+        async def reupload():
+            forget_ticket_file_id(ticket_key)
+            return (await get_ticket_photo(d["buyer"], d["pot"]))[1]
+
+        file_id = await broadcast_photo(
+            bot, photo, announcement, reupload=reupload, reply_markup=group_buy_signal_keyboard()
+        )
+        if file_id:
+            remember_ticket_file_id(ticket_key, file_id)
+        return
+
+    lines = ["📈 <b>Ticket sales update</b>"]
+    for level in _LEVELS:
+        d = pending.get(level)
+        if not d:
+            continue
+        lines.append(
+            f"{_LEVEL_EMOJIS[level]} <b>{d['tickets']} tickets</b> sold in <b>{_LEVEL_NAMES[level]}</b> "
+            f"in the last {_period_label(period)} by {len(d['buyers'])} player(s)\n"
+            f"┗ Pool #{d['pool_id']}: {d['spots_left']}/{POOL_SIZE} spots left | Pot {d['pot']:.2f} SOL"
+        )
+    await broadcast_message(bot, "\n".join(lines), reply_markup=group_buy_signal_keyboard())
+
+async def run_buy_signal_digests(bot: Bot, interval: float = SIGNAL_DIGEST_INTERVAL) -> None:
+    """
+    The first purchase after a quiet period is announced right away;
+    purchases during the following `interval` are announced together at
+    its end. Outbound calls are bounded by groups x (1 / interval),
+    whatever the sales rate.
+    """
+    while True:
+        await _pending_event.wait()
+        try:
+            await flush_buy_signals(bot)
+            await asyncio.sleep(interval)
+            while _pending:
+                await flush_buy_signals(bot, interval)
+                await asyncio.sleep(interval)
+        except Exception as e:
+            logging.error("buy-signal digest failed: %s", e)
+
+# ============================
+#     CROSS-PROCESS SYNC
+# ============================
+
+def _on_signal_groups(conn, pid, channel, payload) -> None:
+    chat_id, _, enabled = payload.partition(" ")
+    apply_buy_signals_change(int(chat_id), enabled == "1")
+
+def _on_buy_signal(conn, pid, channel, payload) -> None:
+    try:
+        _queue_locally(*json.loads(payload))
+    except (ValueError, TypeError) as e:
+        logging.warning("bad buy-signal notification %r: %s", payload, e)
+
+async def run_signal_listener(digest_owner: bool = True) -> None:
+    """
+    Holds a dedicated LISTEN connection, reconnecting when it drops or
+    stops answering: every process follows signal_groups so
+    /enable_signals and /disable_signals reach all of them; the digest
+    owner also collects the purchases other processes forward on
+    buy_signals. The group list is reloaded on every (re)connect to cover
+    changes missed while disconnected.
+    """
+    global _digest_owner
+    _digest_owner = digest_owner
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(DATABASE_URL)
+            await conn.add_listener("signal_groups", _on_signal_groups)
+            if digest_owner:
+                await conn.add_listener("buy_signals", _on_buy_signal)
+            await load_buy_signal_groups()
+            print("[signals] Listening for group and purchase changes.")
+            while True:
+                await asyncio.sleep(LISTENER_CHECK_INTERVAL)
+                # a half-open connection never reports closed; make it answer
+                await conn.fetchval("SELECT 1", timeout=LISTENER_CHECK_INTERVAL)
+        except Exception as e:
+            logging.warning("signals listener error: %s", e)
+        finally:
+            if conn is not None and not conn.is_closed():
+                conn.terminate()
+        await asyncio.sleep(LISTENER_CHECK_INTERVAL)
@@ -10,8 +10,11 @@ from solders.system_program import transfer, TransferParams
 from solders.pubkey import Pubkey
 from solders.keypair import Keypair
 from solders.message import Message
+from solders.signature import Signature
+from solders.transaction_status import TransactionConfirmationStatus
 
 from config import SOLANA_RPC_ENDPOINT, POOL_PUBLIC_KEY
+from metrics import RPC_SECONDS, timed, timer
 
 # ─── Monkey-patch to drop any `proxy` kwarg ───
 _httpx_orig_init = httpx.AsyncClient.__init__
@@ -28,6 +31,7 @@ def _normalize_endpoint(url: str) -> str:
 
 # ─── Helpers ───────────────────────────────────────────────────────────
 
+@timed(RPC_SECONDS, method="get_balance")
 async def get_wallet_balance_lamports(pubkey_str: str) -> int:
     """
     Fetch on-chain balance in lamports, retrying up to 3× on ConnectTimeout.
@@ -55,6 +59,7 @@ async def get_wallet_balance_lamports(pubkey_str: str) -> int:
     finally:
         await client.close()
 
+@timed(RPC_SECONDS, method="get_fee_for_message")
 async def _estimate_fee_lamports(message: Message) -> int:
     """
     Estimate fee in lamports for the given Message,
@@ -106,6 +111,52 @@ async def get_fee_per_signature() -> float:
 
 from solana.exceptions import SolanaRpcException
 
+async def _send_transfer(
+    client: AsyncClient,
+    sender_private_key_b58: str,
+    sender_public_key_str: str,
+    recipient_wallet: str,
+    amount_sol: float
+):
+    """
+    Signs and submits one transfer with a fresh blockhash and preflight on.
+    Returns (signature, last_valid_block_height) without waiting for
+    confirmation; past that block height the transaction can never land.
+    """
+    secret     = base58.b58decode(sender_private_key_b58)
+    sender_kp  = Keypair.from_bytes(secret)
+    sender_pub = Pubkey.from_string(sender_public_key_str)
+    recipient  = Pubkey.from_string(recipient_wallet)
+    lamports   = int(amount_sol * 1e9)
+
+    ix  = transfer(TransferParams(
+              from_pubkey=sender_pub,
+              to_pubkey=recipient,
+              lamports=lamports
+          ))
+    msg = Message([ix], sender_pub)
+
+    # fresh blockhash
+    bh = await client.get_latest_blockhash()
+    tx = Transaction([sender_kp], msg, bh.value.blockhash)
+
+    # ⚠️ preflight ON to catch lamport errors
+    opts = TxOpts(skip_preflight=False, preflight_commitment="confirmed")
+
+    try:
+        resp = await client.send_transaction(tx, opts=opts)
+    except SolanaRpcException as e:
+        text = str(e)
+        # look for the “insufficient lamports” line in the simulation error
+        if "insufficient lamports" in text:
+            # you could even fetch the exact balance again here if you like
+            raise RuntimeError(
+                f"🚧 Insufficient on‐chain balance to send {amount_sol:.6f} SOL; please top up your wallet."
+            ) from e
+        raise
+    return resp.value, bh.value.last_valid_block_height
+
+@timed(RPC_SECONDS, method="pay_sol")
 async def pay_sol(
     sender_private_key_b58: str,
     sender_public_key_str: str,
@@ -122,45 +173,93 @@ async def pay_sol(
         timeout=_RPC_TIMEOUT,
     )
     try:
-        secret     = base58.b58decode(sender_private_key_b58)
-        sender_kp  = Keypair.from_bytes(secret)
-        sender_pub = Pubkey.from_string(sender_public_key_str)
-        recipient  = Pubkey.from_string(recipient_wallet)
-        lamports   = int(amount_sol * 1e9)
+        sig, _ = await _send_transfer(client, sender_private_key_b58, sender_public_key_str, recipient_wallet, amount_sol)
 
-        ix  = transfer(TransferParams(
-                  from_pubkey=sender_pub,
-                  to_pubkey=recipient,
-                  lamports=lamports
-              ))
-        msg = Message([ix], sender_pub)
+        # wait for confirmation (also will error if something went wrong)
+        with timer(RPC_SECONDS, method="confirm_transaction"):
+            await client.confirm_transaction(sig, commitment="confirmed")
+        return str(sig)
 
-        # fresh blockhash
-        bh = await client.get_latest_blockhash()
-        tx = Transaction([sender_kp], msg, bh.value.blockhash)
-
-        # ⚠️ preflight ON to catch lamport errors
-        opts = TxOpts(skip_preflight=False, preflight_commitment="confirmed")
-
-        try:
-            resp = await client.send_transaction(tx, opts=opts)
-        except SolanaRpcException as e:
-            text = str(e)
-            # look for the “insufficient lamports” line in the simulation error
-            if "insufficient lamports" in text:
-                # you could even fetch the exact balance again here if you like
-                raise RuntimeError(
-                    f"🚧 Insufficient on‐chain balance to send {amount_sol:.6f} SOL; please top up your wallet."
-                ) from e
-            raise
+    finally:
+        await client.close()
 
-        # wait for confirmation (also will error if something went wrong)
-        await client.confirm_transaction(resp.value, commitment="confirmed")
-        return str(resp.value)
+@timed(RPC_SECONDS, method="send_sol")
+async def send_sol(
+    sender_private_key_b58: str,
+    sender_public_key_str: str,
+    recipient_wallet: str,
+    amount_sol: float
+) -> tuple:
+    """
+    Like pay_sol, but returns (signature, last_valid_block_height) as soon
+    as the transaction is accepted; track it with get_signature_statuses.
+    """
+    client = AsyncClient(
+        _normalize_endpoint(SOLANA_RPC_ENDPOINT),
+        timeout=_RPC_TIMEOUT,
+    )
+    try:
+        sig, last_valid_block_height = await _send_transfer(
+            client, sender_private_key_b58, sender_public_key_str, recipient_wallet, amount_sol
+        )
+        return str(sig), last_valid_block_height
+    finally:
+        await client.close()
+
+# Max signatures per getSignatureStatuses request
+_STATUS_BATCH = 256
+
+@timed(RPC_SECONDS, method="get_signature_statuses")
+async def get_signature_statuses(signatures: list[str], search_history: bool = False) -> dict:
+    """
+    Looks up many signatures at once (256 per request).
+    Returns {signature: "confirmed" | "failed" | None}, None meaning not
+    (yet) confirmed or unknown to the node. Without `search_history` only
+    the node's recent-status cache is consulted, so None is not proof
+    that a transaction never landed.
+    """
+    client = AsyncClient(
+        _normalize_endpoint(SOLANA_RPC_ENDPOINT),
+        timeout=_RPC_TIMEOUT,
+    )
+    done = (TransactionConfirmationStatus.Confirmed, TransactionConfirmationStatus.Finalized)
+    result = {}
+    try:
+        for i in range(0, len(signatures), _STATUS_BATCH):
+            chunk = signatures[i:i + _STATUS_BATCH]
+            resp = await client.get_signature_statuses(
+                [Signature.from_string(s) for s in chunk], search_transaction_history=search_history
+            )
+            for sig, status in zip(chunk, resp.value):
+                if status is None:
+                    result[sig] = None
+                elif status.err is not None:
+                    result[sig] = "failed"
+                elif status.confirmation_status in done:
+                    result[sig] = "confirmed"
+                else:
+                    result[sig] = None
+        return result
+    finally:
+        await client.close()
 
+@timed(RPC_SECONDS, method="get_block_height")
+async def get_block_height() -> int:
+    """
+    Finalized block height; a blockhash whose last_valid_block_height is
+    below it has expired for good.
+    """
+    client = AsyncClient(
+        _normalize_endpoint(SOLANA_RPC_ENDPOINT),
+        timeout=_RPC_TIMEOUT,
+    )
+    try:
+        resp = await client.get_block_height(commitment="finalized")
+        return resp.value
     finally:
         await client.close()
 
+@timed(RPC_SECONDS, method="batch_pay_sol")
 async def batch_pay_sol(
     sender_private_key_b58: str,
     sender_public_key_str: str,
@@ -0,0 +1,36 @@
+# status_text.py
+"""
+The wallet + pools header shown above the main menus. Kept out of bot.py
+so it can be used (and benchmarked) without the router and its imports.
+"""
+from typing import Optional
+
+from config import POOL_SIZE, _LEVEL_EMOJIS, _LEVEL_NAMES, _LEVELS
+from database import get_user_profile, sync_user_wallet_balance
+from pool_state import get_all_pool_snapshots
+
+async def get_status_text(user_id: int, pools: Optional[dict] = None) -> str:
+    """
+    Wallet + balance header with the current pool of every level.
+    `pools` ({level: {"pool_id", "count", "pot"}}) can be passed in when the
+    caller already fetched it, e.g. from onboard_user.
+    """
+    onchain_balance = await sync_user_wallet_balance(user_id)
+    profile = await get_user_profile(user_id)
+    wallet_pub = (profile and profile["wallet_public_key"]) or "No wallet"
+    if pools is None:
+        pools = await get_all_pool_snapshots()
+
+    lines = [
+        f"💼 <b>Wallet</b>: <code>{wallet_pub}</code>",
+        f"💰 <b>Balance</b>: {onchain_balance:.4f} SOL",
+        "",
+        "🎰 <b>Current Pools</b>:"
+    ]
+    for level in _LEVELS:
+        info = pools.get(level)
+        if info:
+            lines.append(f"{_LEVEL_EMOJIS[level]} <b>{_LEVEL_NAMES[level]}</b> — {info['count']}/{POOL_SIZE} tickets, pot {info['pot']:.2f} SOL")
+        else:
+            lines.append(f"{_LEVEL_EMOJIS[level]} <b>{_LEVEL_NAMES[level]}</b> — No open pool")
+    return "\n".join(lines)
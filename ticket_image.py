@@ -0,0 +1,156 @@
+# ticket_image.py
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from aiogram.types import BufferedInputFile
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+from cache_utils import LRUCache
+from metrics import TICKET_RENDER_SECONDS, timed
+
+TEMPLATE_PATH = "LuckyTicket_monogram.png"
+FONT_PATH = "arialbd.ttf"
+
+# Rendering threads; PIL releases the GIL while drawing and PNG-encoding
+RENDER_WORKERS = min(4, os.cpu_count() or 1)
+
+_template = None   # decoded RGBA ticket template
+_slot = None       # (minx, miny, maxx, maxy) of the blank slot, inclusive
+_font = None
+_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="ticket-render")
+
+# Rendered tickets keyed by a hash of the text drawn on them. PNGs (~1.5 MB
+# each) are only kept until Telegram returns a file_id; from then on the
+# file_id alone is enough to resend the same picture anywhere.
+TICKET_PNG_CACHE_SIZE = 32
+TICKET_FILE_ID_CACHE_SIZE = 10_000
+_png_cache = LRUCache(TICKET_PNG_CACHE_SIZE)
+_file_id_cache = LRUCache(TICKET_FILE_ID_CACHE_SIZE)
+
+def _find_slot(base: Image.Image) -> tuple:
+    """
+    Bounding box of the pure-white area in the bottom-right 40% of the
+    template, or a fixed fallback box when there is none.
+    """
+    w, h = base.size
+    qr_x, qr_y = int(w * 0.6), int(h * 0.6)
+    region = base.crop((qr_x, qr_y, w, h)).convert("RGB")
+    # 255 only where R, G and B are all 255
+    mask = None
+    for band in region.split():
+        white = band.point(lambda v: 255 if v == 255 else 0)
+        mask = white if mask is None else ImageChops.darker(mask, white)
+    bbox = mask.getbbox()
+    if bbox:
+        return qr_x + bbox[0], qr_y + bbox[1], qr_x + bbox[2] - 1, qr_y + bbox[3] - 1
+    return int(w * 0.7), int(h * 0.8), w - 10, h - 10
+
+def init_ticket_renderer() -> None:
+    """
+    Decodes the template, locates the name slot and loads the font once.
+    Called at startup; rendering calls it lazily if that did not happen.
+    """
+    global _template, _slot, _font
+    base = Image.open(TEMPLATE_PATH).convert("RGBA")
+    base.load()
+    font_size = max(24, int(base.size[1] * 0.05))
+    try:
+        font = ImageFont.truetype(FONT_PATH, size=font_size)
+    except OSError:
+        logging.warning("font %s not found, using PIL default font", FONT_PATH)
+        font = ImageFont.load_default()
+    _slot = _find_slot(base)
+    _font = font
+    _template = base
+
+def _make_ticket_image(username: str, amount: float) -> bytes:
+    """
+    Draws a white box with black outline holding `username` in the
+    template's blank slot and returns the PNG bytes.
+    """
+    if _template is None:
+        init_ticket_renderer()
+    base = _template.copy()
+    draw = ImageDraw.Draw(base)
+    minx, miny, maxx, maxy = _slot
+
+    # 1) Measure text
+    text = username
+    bbox = draw.textbbox((0, 0), text, font=_font)
+    tw, th = bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+    # 2) Compute box dimensions
+    pad_x = 10
+    pad_y = 5
+    box_w = max(tw + 2*pad_x, 120)           # enforce minimum 120px
+    box_h = th + 2*pad_y
+    region_w = maxx - minx + 1
+
+    # 3) Center the box inside the white slot
+    box_x1 = minx + (region_w - box_w)//2
+    box_y2 = maxy
+    box_x2 = box_x1 + box_w
+    box_y1 = box_y2 - box_h
+
+    # 4) Draw the white-filled box with 1px black outline
+    draw.rectangle(
+        [(box_x1, box_y1), (box_x2, box_y2)],
+        fill=(255,255,255,255),
+        outline=(0,0,0,255),
+        width=1
+    )
+
+    # 5) Draw the text centered in that box
+    text_x = box_x1 + (box_w - tw)//2
+    text_y = box_y1 + pad_y - 3
+    draw.text((text_x, text_y), text, font=_font, fill=(0,0,0,255))
+
+    # 6) Encode in memory
+    buf = io.BytesIO()
+    base.save(buf, format="PNG")
+    return buf.getvalue()
+
+@timed(TICKET_RENDER_SECONDS)
+async def render_ticket_image(username: str, amount: float) -> bytes:
+    """
+    Renders on the render thread pool so the event loop never blocks on PIL.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _make_ticket_image, username, amount)
+
+def ticket_cache_key(username: str) -> str:
+    """
+    Content address of a ticket: the image depends only on the drawn text.
+    """
+    return hashlib.sha256(username.encode("utf-8")).hexdigest()
+
+async def get_ticket_photo(username: str, amount: float) -> tuple:
+    """
+    Returns (cache_key, photo) where photo is a cached Telegram file_id when
+    this ticket was uploaded before, otherwise the (possibly cached) PNG.
+    Pass the file_id of the first successful upload to remember_ticket_file_id.
+    """
+    key = ticket_cache_key(username)
+    file_id = _file_id_cache.get(key)
+    if file_id:
+        return key, file_id
+    png = _png_cache.get(key)
+    if png is None:
+        png = await render_ticket_image(username, amount)
+        _png_cache.put(key, png)
+    return key, BufferedInputFile(png, filename="ticket.png")
+
+def remember_ticket_file_id(key: str, file_id: str) -> None:
+    _file_id_cache.put(key, file_id)
+    _png_cache.pop(key)
+
+def forget_ticket_file_id(key: str) -> None:
+    """
+    Drops a file_id Telegram no longer accepts; the next get_ticket_photo
+    renders and uploads the PNG again.
+    """
+    _file_id_cache.pop(key)
@@ -0,0 +1,255 @@
+# tracing.py
+"""
+Lightweight trace spans: one trace per incoming update, with child spans
+for the handler, every asyncpg query, Solana RPC call, Telegram API call
+and the phases of a draw. Background work started from a handler (the
+purchase task, a draw) inherits the context and stays in the same trace.
+
+Off unless TRACE_FILE and/or TRACE_OTLP_ENDPOINT is set; finished spans
+are then exported every TRACE_EXPORT_INTERVAL seconds as JSON lines
+and/or OTLP/HTTP JSON (POST <endpoint>/v1/traces, e.g. a local
+OpenTelemetry Collector or Jaeger on :4318). While off, span() costs one
+flag check.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+from config import TRACE_FILE, TRACE_OTLP_ENDPOINT
+
+TRACE_EXPORT_INTERVAL = 2.0
+# Finished spans kept while the exporter is behind; newer ones are dropped
+MAX_PENDING_SPANS = 20_000
+SERVICE_NAME = "luckysol-bot"
+
+enabled = False
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_finished: List["Span"] = []
+_dropped = 0
+_trace_file = ""
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "error", "owner", "phase")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error = None
+        # phase() bookkeeping: the span a phase belongs to / the open phase
+        self.owner = None
+        self.phase = None
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns:
+            return
+        if self.phase is not None:
+            self.phase.finish(error)
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _submit(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+def _submit(s: Span) -> None:
+    global _dropped
+    if len(_finished) >= MAX_PENDING_SPANS:
+        _dropped += 1
+        return
+    _finished.append(s)
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    with span("draw", pool_id=7): ... — a child of the current span, or
+    the root of a new trace.
+    """
+    if not enabled:
+        yield None
+        return
+    s = Span(name, _current.get(), attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.finish(e)
+        raise
+    finally:
+        _current.reset(token)
+        s.finish()
+
+def phase(name: str, **attributes) -> None:
+    """
+    Starts the next sequential phase of the current span and ends the
+    previous one, without re-indenting the code in between:
+    phase("draw.pick"); ...; phase("draw.payout"); ... The last phase
+    ends with the span it belongs to.
+    """
+    if not enabled:
+        return
+    current = _current.get()
+    if current is None:
+        return
+    owner = current.owner or current
+    if owner.phase is not None:
+        owner.phase.finish()
+    p = Span(name, owner, attributes)
+    p.owner = owner
+    owner.phase = p
+    _current.set(p)
+
+def record_span(name: str, seconds: float, error: Optional[BaseException] = None, **attributes) -> None:
+    """
+    Adds an already finished child span that ended now, for timings that
+    are reported after the fact (asyncpg query logger).
+    """
+    if not enabled:
+        return
+    s = Span(name, _current.get(), attributes)
+    s.start_ns = time.time_ns() - int(seconds * 1e9)
+    s.finish(error)
+
+# ----------------------------
+# AIOGRAM HOOKS
+# ----------------------------
+
+def _event_type(update) -> str:
+    for field in ("message", "callback_query", "my_chat_member", "chat_member", "edited_message"):
+        if getattr(update, field, None) is not None:
+            return field
+    return "other"
+
+class UpdateSpanMiddleware(BaseMiddleware):
+    """
+    Register as the first outer middleware on dp.update: the root span of
+    each update's trace.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        with span("update", update_id=event.update_id, type=_event_type(event),
+                  user_id=user.id if user else None):
+            return await handler(event, data)
+
+class TelegramSpanMiddleware(BaseRequestMiddleware):
+    """
+    bot.session.middleware(TelegramSpanMiddleware()): one span per Bot API call.
+    """
+    async def __call__(self, make_request, bot, method):
+        with span(f"telegram.{type(method).__name__}", chat_id=getattr(method, "chat_id", None)):
+            return await make_request(bot, method)
+
+# ----------------------------
+# EXPORT
+# ----------------------------
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_payload(spans: List[Span]) -> dict:
+    otlp_spans = []
+    for s in spans:
+        otlp = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [
+                {"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items() if v is not None
+            ],
+            "status": {"code": 2, "message": s.error} if s.error else {},
+        }
+        if s.parent_id:
+            otlp["parentSpanId"] = s.parent_id
+        otlp_spans.append(otlp)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "luckysol"}, "spans": otlp_spans}],
+    }]}
+
+def _write_jsonl(path: str, spans: List[Span]) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans))
+
+async def export_spans(http: Optional[aiohttp.ClientSession] = None) -> None:
+    global _finished, _dropped
+    if not _finished:
+        return
+    spans, _finished = _finished, []
+    if _dropped:
+        logging.warning("tracing dropped %d spans, exporter is behind", _dropped)
+        _dropped = 0
+    if _trace_file:
+        try:
+            await asyncio.to_thread(_write_jsonl, _trace_file, spans)
+        except OSError as e:
+            logging.warning("trace file export failed: %s", e)
+    if http is not None:
+        try:
+            url = TRACE_OTLP_ENDPOINT.rstrip("/") + "/v1/traces"
+            async with http.post(url, json=_otlp_payload(spans), timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                if resp.status >= 300:
+                    logging.warning("OTLP export rejected (%d): %s", resp.status, await resp.text())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning("OTLP export failed: %s", e)
+
+async def run_trace_exporter(interval: float = TRACE_EXPORT_INTERVAL) -> None:
+    http = aiohttp.ClientSession() if TRACE_OTLP_ENDPOINT else None
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            await export_spans(http)
+    finally:
+        await export_spans(http)
+        if http is not None:
+            await http.close()
+
+def init_tracing(worker: int = 0) -> bool:
+    """
+    Turns tracing on when an exporter is configured; webhook workers write
+    their own TRACE_FILE.<worker>. Returns whether tracing is on.
+    """
+    global enabled, _trace_file
+    if not (TRACE_FILE or TRACE_OTLP_ENDPOINT):
+        return False
+    _trace_file = TRACE_FILE if worker == 0 or not TRACE_FILE else f"{TRACE_FILE}.{worker}"
+    enabled = True
+    print(f"[tracing] Exporting spans to {', '.join(filter(None, (_trace_file, TRACE_OTLP_ENDPOINT)))}.")
+    return True
@@ -0,0 +1,172 @@
+# update_recorder.py
+"""
+Opt-in recording of incoming updates for offline replay
+(benchmarks/replay.py). Enabled by RECORD_UPDATES=<path>; every update
+is appended to that file as one gzip-compressed JSON line
+{"t": unix time, "update": {...}}, flushed once a second.
+
+Identities are anonymized before anything is written: user and chat ids
+(including the id in a /start ref<id> payload) are replaced by a keyed
+hash, so the same person keeps the same pseudonym across the recording
+and referral chains stay intact. Only fields the replay needs are kept
+(_KEPT_FIELDS); everything else - usernames, contacts, forwards, file
+names, inline queries - is dropped. Names become placeholders, and free
+text other than commands and amounts is replaced by a placeholder address.
+"""
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from aiogram import BaseMiddleware
+
+from config import BOT_TOKEN, RECORD_UPDATES, RECORD_UPDATES_SALT
+
+# Pseudonymous ids are drawn from this range, far above real Telegram ids
+ANON_ID_BASE = 9_300_000_000_000
+ANON_ID_SPAN = 10 ** 12
+PLACEHOLDER_TEXT = "11111111111111111111111111111111"
+RECORD_FLUSH_INTERVAL = 1.0
+
+# Allow-list: any other field, at any depth, is not recorded
+_KEPT_FIELDS = frozenset((
+    # update kinds the bot handles
+    "update_id", "message", "callback_query", "my_chat_member",
+    # messages and callbacks
+    "message_id", "date", "chat", "from", "text", "caption", "entities",
+    "offset", "length", "data", "chat_instance",
+    # users and chats
+    "id", "is_bot", "type", "first_name", "title",
+    # membership changes (bot added to / removed from a group)
+    "old_chat_member", "new_chat_member", "status", "user",
+))
+# Required by the Bot API types, so replaced rather than dropped
+_PLACEHOLDER_NAMES = {"first_name": "User", "title": "Chat"}
+_KEPT_TEXT = re.compile(r"^/\w+|^[\d.,]+$|^all$", re.IGNORECASE)
+_REF_PAYLOAD = re.compile(r"^(/start(?:@\w+)? ref)(\d+)$")
+
+class UpdateRecorder:
+    def __init__(self, path: str, salt: str = ""):
+        self.path = path
+        self._key = (salt or BOT_TOKEN).encode()
+        self._buffer: List[str] = []
+        self._wakeup = asyncio.Event()
+
+    def anon_id(self, real_id: int) -> int:
+        digest = hmac.new(self._key, str(abs(real_id)).encode(), hashlib.sha256).digest()
+        anon = ANON_ID_BASE + int.from_bytes(digest[:8], "big") % ANON_ID_SPAN
+        # group chats keep their negative sign
+        return -anon if real_id < 0 else anon
+
+    def anonymize(self, node: Any) -> Any:
+        if isinstance(node, list):
+            return [self.anonymize(v) for v in node]
+        if not isinstance(node, dict):
+            return node
+        out = {}
+        # users and chats: an id next to a name or a chat type
+        is_identity = "id" in node and ("first_name" in node or "type" in node)
+        for key, value in node.items():
+            if key not in _KEPT_FIELDS:
+                continue
+            if key in _PLACEHOLDER_NAMES:
+                out[key] = _PLACEHOLDER_NAMES[key]
+                continue
+            if is_identity and key == "id":
+                out[key] = self.anon_id(value)
+            elif key == "chat_instance":
+                out[key] = hmac.new(self._key, str(value).encode(), hashlib.sha256).hexdigest()[:16]
+            elif key in ("text", "caption") and isinstance(value, str):
+                out[key] = self._anonymize_text(value)
+            else:
+                out[key] = self.anonymize(value)
+        return out
+
+    def _anonymize_text(self, text: str) -> str:
+        ref = _REF_PAYLOAD.match(text)
+        if ref:
+            return f"{ref.group(1)}{self.anon_id(int(ref.group(2)))}"
+        return text if _KEPT_TEXT.match(text) else PLACEHOLDER_TEXT
+
+    def record(self, update_data: dict) -> None:
+        line = json.dumps(
+            {"t": round(time.time(), 3), "update": self.anonymize(update_data)},
+            separators=(",", ":"), ensure_ascii=False
+        )
+        self._buffer.append(line)
+        self._wakeup.set()
+
+    def flush(self) -> None:
+        """
+        Appends buffered lines as a new gzip member; readers see one stream.
+        """
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    async def run(self, interval: float = RECORD_FLUSH_INTERVAL) -> None:
+        print(f"[recorder] Recording anonymized updates to {self.path}.")
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                await asyncio.sleep(interval)
+                try:
+                    await asyncio.to_thread(self.flush)
+                except OSError as e:
+                    logging.warning("update recorder flush failed: %s", e)
+        finally:
+            self.flush()
+
+class UpdateRecorderMiddleware(BaseMiddleware):
+    """
+    Register as outer middleware on dp.update; records before handling,
+    so updates whose handler hangs or fails are in the file too.
+    """
+    def __init__(self, recorder: UpdateRecorder):
+        self.recorder = recorder
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        try:
+            self.recorder.record(event.model_dump(mode="json", exclude_none=True))
+        except Exception as e:
+            logging.warning("update recorder skipped update: %s", e)
+        return await handler(event, data)
+
+def recorder_for_worker(worker: int = 0) -> UpdateRecorder:
+    """
+    The configured recorder; webhook workers each write their own file.
+    """
+    path = RECORD_UPDATES if worker == 0 else f"{RECORD_UPDATES}.{worker}"
+    return UpdateRecorder(path, RECORD_UPDATES_SALT)
+
+def read_recording(path: str) -> List[dict]:
+    """
+    [{"t", "update"}] from a recording (gzip or plain JSONL). Lines that
+    are a bare Update, e.g. hand-written loadgen input, get t=0.
+    """
+    opener = gzip.open if path.endswith(".gz") or _is_gzip(path) else open
+    records = []
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            records.append(data if "update" in data else {"t": 0.0, "update": data})
+    return records
+
+def _is_gzip(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(2) == b"\x1f\x8b"
@@ -0,0 +1,61 @@
+# update_scope.py
+"""
+Per-update memoization. UpdateScopeMiddleware gives every incoming update
+its own scope; inside it, `memoized(key, fn, *args)` runs fn at most once
+per key, so helpers like sync_user_wallet_balance can be called from
+several places in one click without repeating the RPC.
+
+Outside an update (background jobs, scripts) nothing is memoized.
+"""
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+
+_scope: ContextVar[Optional[Dict]] = ContextVar("update_scope", default=None)
+# Set on a scope when its update is done; tasks spawned by the handler
+# still see the dict through their copied context but must not reuse it
+_CLOSED = object()
+
+async def memoized(key, fn: Callable[..., Awaitable], *args) -> Any:
+    scope = _scope.get()
+    if scope is None or _CLOSED in scope:
+        return await fn(*args)
+    future = scope.get(key)
+    if future is None:
+        # a shared task, so concurrent callers within the update wait for one call
+        future = scope[key] = asyncio.ensure_future(fn(*args))
+    try:
+        return await asyncio.shield(future)
+    except Exception:
+        scope.pop(key, None)
+        raise
+
+def forget(key) -> None:
+    """
+    Drops a memoized value, e.g. after the handler changed the data behind it.
+    """
+    scope = _scope.get()
+    if scope is not None:
+        scope.pop(key, None)
+
+class UpdateScopeMiddleware(BaseMiddleware):
+    """
+    Register as outer middleware on dp.update, so filters and handler
+    share one scope.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        scope = {}
+        token = _scope.set(scope)
+        try:
+            return await handler(event, data)
+        finally:
+            _scope.reset(token)
+            scope.clear()
+            scope[_CLOSED] = True
@@ -0,0 +1,157 @@
+# webhook.py
+"""
+Webhook mode: an aiohttp front process receives updates from Telegram and
+hands each one to one of WEBHOOK_WORKERS worker processes, chosen by the
+id of the user that sent it. Every worker runs its own DB pool, Bot and
+Dispatcher (see main.setup_bot).
+
+Ordering: all updates of one user land in the same worker, which handles
+them one after another, while updates of different users run concurrently.
+
+Only worker 0 runs the maintenance jobs (archival, keypair refill,
+withdrawals) and the buy-signal digests, which the other workers forward
+their purchases to; each worker keeps its own pool-state and signal
+listeners.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import multiprocessing
+from typing import Dict
+
+from aiohttp import web
+
+from config import (
+    BOT_TOKEN, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+    WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_WORKERS
+)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def update_user_id(update: dict) -> int:
+    """
+    Id of the user an update came from; the chat id for updates without a
+    user (channel posts), 0 when there is neither.
+    """
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user")
+        if user:
+            return user["id"]
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+    return 0
+
+def shard_for(user_id: int, workers: int) -> int:
+    return user_id % workers
+
+# ----------------------------
+# WORKER PROCESS
+# ----------------------------
+
+# user_id -> lock held while one of their updates is being handled
+_user_locks: Dict[int, asyncio.Lock] = {}
+# user_id -> updates received but not finished yet
+_user_pending: Dict[int, int] = {}
+
+async def _handle_update(bot, dp, user_id: int, data: dict) -> None:
+    from aiogram.types import Update
+    lock = _user_locks[user_id]
+    try:
+        async with lock:
+            update = Update.model_validate(data, context={"bot": bot})
+            await dp.feed_update(bot, update)
+    except Exception as e:
+        logging.error("update %s failed: %s", data.get("update_id"), e)
+    finally:
+        _user_pending[user_id] -= 1
+        if not _user_pending[user_id]:
+            del _user_pending[user_id]
+            del _user_locks[user_id]
+
+async def _worker_main(index: int, queue) -> None:
+    from main import setup_bot
+    bot, dp, _ = await setup_bot(worker=index)
+    print(f"[webhook] Worker {index} ready.")
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, queue.get)
+            if raw is None:
+                break
+            data = json.loads(raw)
+            user_id = update_user_id(data)
+            # the lock is taken in arrival order, so per-user order is kept
+            _user_locks.setdefault(user_id, asyncio.Lock())
+            _user_pending[user_id] = _user_pending.get(user_id, 0) + 1
+            task = asyncio.create_task(_handle_update(bot, dp, user_id, data))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        # shutdown handlers, e.g. flushing buffered FSM writes
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+def _worker_entry(index: int, queue) -> None:
+    import main  # noqa: F401  (sets the Windows event loop policy)
+    asyncio.run(_worker_main(index, queue))
+
+# ----------------------------
+# FRONT PROCESS
+# ----------------------------
+
+async def _receive(request: web.Request) -> web.Response:
+    if WEBHOOK_SECRET and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), WEBHOOK_SECRET):
+        return web.Response(status=401)
+    raw = await request.text()
+    try:
+        user_id = update_user_id(json.loads(raw))
+    except (ValueError, AttributeError, KeyError, TypeError):
+        return web.Response(status=400)
+    queues = request.app["queues"]
+    queues[shard_for(user_id, len(queues))].put(raw)
+    return web.Response()
+
+async def _set_webhook(app: web.Application) -> None:
+    from aiogram import Bot
+    bot = Bot(token=BOT_TOKEN)
+    try:
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            drop_pending_updates=True,
+        )
+    finally:
+        await bot.session.close()
+    print(f"[webhook] Webhook set, {len(app['queues'])} workers.")
+
+def make_app(queues: list, set_webhook: bool = True) -> web.Application:
+    app = web.Application()
+    app["queues"] = queues
+    app.router.add_post(WEBHOOK_PATH, _receive)
+    if set_webhook:
+        app.on_startup.append(_set_webhook)
+    return app
+
+def run_webhook(workers: int = WEBHOOK_WORKERS, set_webhook: bool = True) -> None:
+    """
+    Starts the worker processes, then serves the webhook until interrupted.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue() for _ in range(workers)]
+    procs = [ctx.Process(target=_worker_entry, args=(i, q), name=f"bot-worker-{i}") for i, q in enumerate(queues)]
+    for p in procs:
+        p.start()
+    try:
+        web.run_app(make_app(queues, set_webhook), host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+    finally:
+        for q in queues:
+            q.put(None)
+        for p in procs:
+            p.join(timeout=30)
@@ -0,0 +1,287 @@
+# withdrawals.py
+"""
+Queued withdrawals. The bot only records a request (enqueue_withdrawal);
+run_withdrawal_worker sends the transfers with at most WITHDRAW_CONCURRENCY
+in flight, and run_confirmation_poller checks every sent signature with
+one batched getSignatureStatuses call per round and tells the user when
+their withdrawal settled. A transfer still unseen after CONFIRM_TIMEOUT is
+only declared expired once the chain is past its blockhash's last valid
+block height and a full-history lookup does not find it either; until
+then it stays 'sent'.
+
+A claimed row is leased to this instance (claimed_by/claimed_at). Rows
+left in 'processing' past PROCESSING_LEASE were interrupted mid-send; they
+are marked failed rather than retried, since the transfer may have gone
+out. Rows another live instance is still sending are left alone.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Optional
+
+from aiogram import Bot
+
+from database import record_ledger_entries
+from global_pool import get_connection, release_connection
+from keyboards import main_menu_keyboard
+
+# Transfers being sent at the same time
+WITHDRAW_CONCURRENCY = 4
+# Seconds between checks for new requests / pending confirmations
+WITHDRAW_POLL_INTERVAL = 2.0
+# A sent transfer not confirmed after this many seconds is checked for expiry
+CONFIRM_TIMEOUT = 120
+# Left in the wallet when withdrawing "all", for the transaction fee
+ALL_FEE_RESERVE = 0.001
+# A 'processing' row older than this is considered abandoned by its sender
+# (well above the balance lookup plus send, each capped at 60s)
+PROCESSING_LEASE = 300
+
+# Identifies this process as the sender of the rows it claims
+INSTANCE_ID = uuid.uuid4().hex
+_wakeup = asyncio.Event()
+
+async def enqueue_withdrawal(user_id: int, chat_id: int, recipient: str, amount: Optional[float]) -> int:
+    """
+    Records a withdrawal request; amount None withdraws the whole balance.
+    Returns the withdrawal id.
+    """
+    conn = await get_connection()
+    try:
+        withdrawal_id = await conn.fetchval(
+            "INSERT INTO withdrawals (user_id, chat_id, recipient, amount) VALUES ($1,$2,$3,$4) RETURNING id",
+            user_id, chat_id, recipient, amount
+        )
+    finally:
+        await release_connection(conn)
+    _wakeup.set()
+    return withdrawal_id
+
+async def _notify(bot: Bot, chat_id: int, text: str) -> None:
+    try:
+        await bot.send_message(chat_id, text, reply_markup=main_menu_keyboard())
+    except Exception as e:
+        logging.warning("withdrawal notice to %s failed: %s", chat_id, e)
+
+async def _fail(bot: Bot, row, error: str, status: str = "failed") -> None:
+    """
+    Settles a withdrawal that is still in flight; rows another instance
+    already settled are left as they are, and nobody is notified twice.
+    """
+    conn = await get_connection()
+    try:
+        failed = await conn.fetchval(
+            "UPDATE withdrawals SET status=$2, error=$3, settled_at=NOW() "
+            "WHERE id=$1 AND status IN ('processing', 'sent') RETURNING id",
+            row["id"], status, error
+        )
+    finally:
+        await release_connection(conn)
+    if failed:
+        await _notify(bot, row["chat_id"], f"❌ <b>Withdrawal #{row['id']} failed:</b> {error}")
+
+# ----------------------------
+# SENDING
+# ----------------------------
+
+async def _send(bot: Bot, row) -> None:
+    from solana_utils import get_wallet_balance, send_sol
+    conn = await get_connection()
+    try:
+        wallet = await conn.fetchrow(
+            "SELECT wallet_public_key, wallet_private_key FROM users WHERE user_id=$1",
+            row["user_id"]
+        )
+    finally:
+        await release_connection(conn)
+    if not wallet or not wallet["wallet_public_key"]:
+        return await _fail(bot, row, "No wallet found. Use /start.")
+
+    pub, priv = wallet["wallet_public_key"], wallet["wallet_private_key"]
+    balance = await get_wallet_balance(pub)
+    amount = balance - ALL_FEE_RESERVE if row["amount"] is None else row["amount"]
+    if amount <= 0 or amount > balance:
+        return await _fail(bot, row, f"Insufficient funds: {balance:.4f} SOL")
+
+    try:
+        sig, last_valid_block_height = await send_sol(priv, pub, row["recipient"], amount)
+    except Exception as e:
+        return await _fail(bot, row, str(e))
+
+    conn = await get_connection()
+    try:
+        updated = await conn.fetchval(
+            """
+            UPDATE withdrawals SET status='sent', signature=$2, amount=$3, sent_at=NOW(),
+                   last_valid_block_height=$4
+             WHERE id=$1 AND status='processing' AND claimed_by=$5
+            RETURNING id
+            """,
+            row["id"], sig, amount, last_valid_block_height, INSTANCE_ID
+        )
+        if not updated:
+            # the lease was taken away while sending; keep the signature for reconciliation
+            await conn.execute(
+                "UPDATE withdrawals SET signature=$2 WHERE id=$1 AND signature IS NULL",
+                row["id"], sig
+            )
+            logging.error("withdrawal %s was reclaimed while sending, transfer %s went out", row["id"], sig)
+    finally:
+        await release_connection(conn)
+
+async def _claim_pending(limit: int) -> list:
+    conn = await get_connection()
+    try:
+        return await conn.fetch(
+            """
+            UPDATE withdrawals SET status='processing', claimed_by=$2, claimed_at=NOW()
+             WHERE id IN (SELECT id FROM withdrawals WHERE status='pending'
+                           ORDER BY id LIMIT $1 FOR UPDATE SKIP LOCKED)
+            RETURNING id, user_id, chat_id, recipient, amount
+            """,
+            limit, INSTANCE_ID
+        )
+    finally:
+        await release_connection(conn)
+
+async def _fail_interrupted(bot: Bot) -> None:
+    """
+    Fails 'processing' rows whose lease has run out; rows claimed by other
+    instances within PROCESSING_LEASE are still being sent.
+    """
+    conn = await get_connection()
+    try:
+        rows = await conn.fetch(
+            """
+            UPDATE withdrawals SET status='failed', error='interrupted', settled_at=NOW()
+             WHERE status='processing'
+               AND (claimed_at IS NULL OR claimed_at < NOW() - make_interval(secs => $1))
+            RETURNING id, chat_id
+            """,
+            PROCESSING_LEASE
+        )
+    finally:
+        await release_connection(conn)
+    for r in rows:
+        await _notify(
+            bot, r["chat_id"],
+            f"⚠️ <b>Withdrawal #{r['id']} was interrupted.</b> Check your wallet balance before trying again."
+        )
+
+async def run_withdrawal_worker(bot: Bot, concurrency: int = WITHDRAW_CONCURRENCY) -> None:
+    in_flight = set()
+    next_lease_check = 0.0
+
+    async def send(row):
+        try:
+            await _send(bot, row)
+        except Exception as e:
+            logging.error("withdrawal %s failed: %s", row["id"], e)
+
+    def done(task):
+        in_flight.discard(task)
+        _wakeup.set()  # a slot is free again
+
+    while True:
+        try:
+            if time.monotonic() >= next_lease_check:
+                await _fail_interrupted(bot)
+                next_lease_check = time.monotonic() + PROCESSING_LEASE / 5
+            free = concurrency - len(in_flight)
+            for row in (await _claim_pending(free) if free > 0 else []):
+                task = asyncio.create_task(send(row))
+                in_flight.add(task)
+                task.add_done_callback(done)
+        except Exception as e:
+            logging.error("withdrawal worker error: %s", e)
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=WITHDRAW_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+# ----------------------------
+# CONFIRMATION
+# ----------------------------
+
+async def _confirm(bot: Bot, r) -> None:
+    conn = await get_connection()
+    try:
+        async with conn.transaction():
+            settled = await conn.fetchval(
+                "UPDATE withdrawals SET status='confirmed', settled_at=NOW() "
+                "WHERE id=$1 AND status='sent' RETURNING id",
+                r["id"]
+            )
+            if settled:
+                await record_ledger_entries(conn, [
+                    (r["user_id"], "withdrawal", -r["amount"], None, r["recipient"], r["signature"])
+                ])
+    finally:
+        await release_connection(conn)
+    if settled:
+        await _notify(
+            bot, r["chat_id"],
+            f"🚀 <b>Withdrawn {r['amount']:.4f} SOL</b>\nTx: https://solscan.io/tx/{r['signature']}"
+        )
+
+async def _expire_overdue(bot: Bot, overdue: list) -> None:
+    """
+    Settles overdue 'sent' rows whose blockhash has provably expired:
+    a full-history lookup decides between confirmed, failed and expired.
+    Rows sent before last_valid_block_height was stored are left alone.
+    """
+    from solana_utils import get_block_height, get_signature_statuses
+    height = await get_block_height()
+    expired = [r for r in overdue
+               if r["last_valid_block_height"] is not None and height > r["last_valid_block_height"]]
+    if not expired:
+        return
+    statuses = await get_signature_statuses([r["signature"] for r in expired], search_history=True)
+    for r in expired:
+        status = statuses.get(r["signature"])
+        if status == "confirmed":
+            await _confirm(bot, r)
+        elif status == "failed":
+            await _fail(bot, r, "transaction failed on-chain")
+        else:
+            await _fail(bot, r, "transaction expired without landing, no funds were moved", status="expired")
+
+async def _poll_confirmations(bot: Bot) -> None:
+    from solana_utils import get_signature_statuses
+    conn = await get_connection()
+    try:
+        rows = await conn.fetch(
+            """
+            SELECT id, user_id, chat_id, recipient, signature, amount, last_valid_block_height,
+                   sent_at < NOW() - make_interval(secs => $1) AS overdue
+              FROM withdrawals WHERE status='sent'
+            """,
+            CONFIRM_TIMEOUT
+        )
+    finally:
+        await release_connection(conn)
+    if not rows:
+        return
+
+    statuses = await get_signature_statuses([r["signature"] for r in rows])
+    overdue = []
+    for r in rows:
+        status = statuses.get(r["signature"])
+        if status == "confirmed":
+            await _confirm(bot, r)
+        elif status == "failed":
+            await _fail(bot, r, "transaction failed on-chain")
+        elif r["overdue"]:
+            overdue.append(r)
+    if overdue:
+        await _expire_overdue(bot, overdue)
+
+async def run_confirmation_poller(bot: Bot, interval: float = WITHDRAW_POLL_INTERVAL) -> None:
+    while True:
+        try:
+            await _poll_confirmations(bot)
+        except Exception as e:
+            logging.error("withdrawal confirmation poll failed: %s", e)
+        await asyncio.sleep(interval)